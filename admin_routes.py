@@ -1,9 +1,9 @@
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, jsonify, Response
 from flask_login import login_required, current_user
 from sqlalchemy import func, desc 
 from sqlalchemy.orm import joinedload
-from datetime import datetime, timezone 
+from datetime import datetime, timezone, timedelta
 
 import functools
 
@@ -11,6 +11,17 @@ import functools
 from extensions import db 
 from models import User, Role, Event, Rating, Category, Registration, Notification, RegistrationStatus 
 from forms import CategoryForm, UserRoleForm, NotificationForm 
+import search
+from pagination import keyset_paginate, estimate_row_count
+import registrations as registration_service
+from jobs import enqueue
+import notifications # Registers the broadcast job handler
+import instrumentation
+import event_cache
+import stats
+import jobs
+import follow_graph
+import calendars
 # Removed 'Message' import, as it's not used in this blueprint for sending emails.
 # from flask_mail import Message 
 
@@ -31,10 +42,7 @@ def admin_required(f):
 @admin_bp.route('/dashboard')
 @admin_required
 def admin_dashboard():
-    total_users = db.session.query(func.count(User.id)).scalar()
-    total_events = db.session.query(func.count(Event.id)).scalar()
-    total_registrations = db.session.query(func.count(Registration.id)).scalar()
-    total_categories = db.session.query(func.count(Category.id)).scalar()
+    totals = stats.site_totals() # Rollups, refreshed in the background when stale
 
     naive_utc_now = datetime.now(timezone.utc).replace(tzinfo=None) 
 
@@ -45,14 +53,64 @@ def admin_dashboard():
     recent_registrations = Registration.query.order_by(Registration.registration_date.desc()).limit(3).all()
 
     return render_template('admin/admin_dashboard.html',
-                           total_users=total_users,
-                           total_events=total_events,
-                           total_registrations=total_registrations,
-                           total_categories=total_categories,
+                           total_users=totals.users,
+                           total_events=totals.events,
+                           total_registrations=totals.registrations,
+                           total_categories=totals.categories,
                            recent_users=recent_users,
                            upcoming_events=upcoming_events,
                            recent_registrations=recent_registrations)
 
+# Per-endpoint timings collected by instrumentation.py (only when PERF_PAGE is enabled)
+@admin_bp.route('/perf')
+@admin_required
+def perf():
+    if not current_app.config.get('PERF_PAGE'):
+        abort(404)
+    rows = instrumentation.endpoint_report()
+    if request.args.get('format') == 'json':
+        return jsonify(endpoints=rows)
+    return render_template('admin/perf.html', title='Performance', rows=rows)
+
+@admin_bp.route('/perf/reset', methods=['POST'])
+@admin_required
+def reset_perf():
+    if not current_app.config.get('PERF_PAGE'):
+        abort(404)
+    instrumentation.reset_samples()
+    flash('Performance samples cleared.', 'success')
+    return redirect(url_for('admin.perf'))
+
+# Attendance / no-show / rating / cohort analytics, optionally for one organizer (?organizer_id=)
+@admin_bp.route('/analytics')
+@admin_required
+def analytics_report():
+    import analytics # pandas; only loaded by processes that serve reports
+    organizer_id = request.args.get('organizer_id', type=int)
+    report = analytics.get_report(organizer_id)
+    organizers = User.query.filter(User.role.in_([Role.ORGANIZER, Role.ADMIN])).order_by(User.username).all()
+    return render_template('admin/analytics.html', title='Analytics', report=report,
+                           organizer_id=organizer_id, organizers=organizers)
+
+@admin_bp.route('/analytics/export')
+@admin_required
+def export_analytics():
+    import analytics
+    organizer_id = request.args.get('organizer_id', type=int)
+    filename_stem = f"analytics_{organizer_id or 'all'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if request.args.get('format') == 'csv':
+        table = request.args.get('table', 'events')
+        if table not in analytics.TABLES:
+            abort(404)
+        response = Response(analytics.table_csv(analytics.get_report(organizer_id), table), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename_stem}_{table}.csv"'
+        return response
+
+    job = jobs.enqueue('analytics_report', {'organizer_id': organizer_id, 'download_name': f'{filename_stem}.xlsx'},
+                       owner_id=current_user.id)
+    db.session.commit()
+    return jobs.job_accepted_response(job)
+
 # --- Category Management Routes ---
 
 @admin_bp.route('/manage_categories', methods=['GET', 'POST'])
@@ -92,6 +150,9 @@ def edit_category(category_id):
                 return render_template('admin/edit_category.html', title='Edit Category', form=form, category=category)
         
         category.name = form.name.data
+        search.reindex_category(category.id) # Category names are part of the event search index
+        event_cache.invalidate_events_where(Event.category_id == category.id) # ...and of the cached event pages
+        calendars.invalidate_events_where(Event.category_id == category.id) # ...and calendar months
         db.session.commit()
         flash(f'Category "{category.name}" updated successfully!', 'success')
         return redirect(url_for('admin.manage_categories'))
@@ -125,8 +186,13 @@ def delete_category(category_id):
 @admin_required
 def manage_users():
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor') # Any 'cursor' arg (even empty) switches to keyset pagination
     users_query = User.query.order_by(User.username.asc())
-    users_pagination = users_query.paginate(page=page, per_page=10, error_out=False)
+    if cursor is not None:
+        users_pagination = keyset_paginate(users_query, (User.username, User.id), cursor=cursor,
+                                           per_page=10, total=estimate_row_count(User))
+    else:
+        users_pagination = users_query.paginate(page=page, per_page=10, error_out=False)
 
     return render_template('admin/manage_users.html',
                            title='Manage Users',
@@ -164,6 +230,7 @@ def delete_user(user_id):
         flash("You cannot delete your own account from here!", 'danger')
         return redirect(url_for('admin.manage_users'))
 
+    follow_graph.remove_user(user.id)
     db.session.delete(user)
     db.session.commit()
     flash(f'User {user.username} deleted successfully!', 'success')
@@ -173,11 +240,81 @@ def delete_user(user_id):
 @admin_bp.route('/manage_registrations')
 @admin_required
 def manage_registrations():
-    registrations = Registration.query.options(joinedload(Registration.user), joinedload(Registration.event)).order_by(Registration.registration_date.desc()).all()
+    filters = _registration_filters(request.args)
+    newest_first = request.args.get('sort', 'newest') != 'oldest'
+
+    # One grouped query for the per-status badges, over the same filters minus the status itself
+    status_counts = {status: 0 for status in RegistrationStatus}
+    counts_query = db.session.query(Registration.status, func.count(Registration.id)) \
+        .filter(*_registration_criteria(filters, with_status=False)).group_by(Registration.status)
+    for status, count in counts_query:
+        status_counts[status] = count
+    total = status_counts[filters['status']] if filters['status'] else sum(status_counts.values())
+
+    # Always keyset paginated on (registration_date, id): every filter combination has an index
+    # that starts with its equality columns and ends in registration_date
+    registrations_query = Registration.query.options(joinedload(Registration.user), joinedload(Registration.event)) \
+        .filter(*_registration_criteria(filters))
+    pagination_object = keyset_paginate(registrations_query, (Registration.registration_date, Registration.id),
+                                        cursor=request.args.get('cursor'), per_page=50,
+                                        descending=newest_first, total=total)
 
     return render_template('admin/manage_registrations.html',
                            title='Manage Registrations',
-                           registrations=registrations)
+                           registrations=pagination_object.items,
+                           pagination=pagination_object,
+                           status_counts=status_counts,
+                           filters=filters,
+                           sort='newest' if newest_first else 'oldest')
+
+
+def _registration_filters(args):
+    """
+    Registration list filters from the query string: event id, status, user (username or id)
+    and a registration date range (YYYY-MM-DD, both ends inclusive). Invalid values are ignored.
+    """
+    filters = {'event_id': args.get('event_id', type=int), 'status': None, 'user_id': None,
+               'user': args.get('user', '').strip(), 'date_from': None, 'date_to': None}
+    try:
+        filters['status'] = RegistrationStatus(args.get('status', '').lower()) if args.get('status') else None
+    except ValueError:
+        pass
+    if filters['user']:
+        if filters['user'].isdigit():
+            filters['user_id'] = int(filters['user'])
+        else:
+            user = User.query.filter_by(username=filters['user']).first()
+            filters['user_id'] = user.id if user else -1 # Unknown user: match nothing
+    for key in ('date_from', 'date_to'):
+        try:
+            filters[key] = datetime.strptime(args.get(key, ''), '%Y-%m-%d')
+        except ValueError:
+            pass
+    return filters
+
+
+def _invalid_registration_filters(args, filters):
+    """Names of the filters given in args that _registration_filters() couldn't use."""
+    invalid = [key for key in ('event_id', 'status', 'date_from', 'date_to') if args.get(key) and filters[key] is None]
+    if filters['user_id'] == -1:
+        invalid.append('user')
+    return invalid
+
+
+def _registration_criteria(filters, with_status=True):
+    """WHERE clauses on Registration for filters from _registration_filters(); empty when nothing is filtered."""
+    criteria = []
+    if filters['event_id']:
+        criteria.append(Registration.event_id == filters['event_id'])
+    if filters['user_id']:
+        criteria.append(Registration.user_id == filters['user_id'])
+    if with_status and filters['status']:
+        criteria.append(Registration.status == filters['status'])
+    if filters['date_from']:
+        criteria.append(Registration.registration_date >= filters['date_from'])
+    if filters['date_to']:
+        criteria.append(Registration.registration_date < filters['date_to'] + timedelta(days=1))
+    return criteria
 
 # Routes for updating registration statuses - ONLY IN-APP NOTIFICATION
 @admin_bp.route('/manage_registrations/<int:reg_id>/approve', methods=['POST'])
@@ -192,7 +329,7 @@ def approve_registration(reg_id):
         flash(f'Registration for {registration.user.username} to {registration.event.title} is already approved.', 'info')
         return redirect(url_for('admin.manage_registrations'))
 
-    registration.status = RegistrationStatus.APPROVED
+    registration_service.set_status(registration, RegistrationStatus.APPROVED)
     db.session.commit()
 
     # Send in-app notification (REMAINS)
@@ -217,7 +354,7 @@ def reject_registration(reg_id):
         flash(f'Registration for {registration.user.username} to {registration.event.title} is already cancelled/rejected.', 'info')
         return redirect(url_for('admin.manage_registrations'))
 
-    registration.status = RegistrationStatus.CANCELLED 
+    registration_service.set_status(registration, RegistrationStatus.CANCELLED) # Frees the seat for the waitlist
     db.session.commit()
 
     # Send in-app notification (REMAINS)
@@ -242,7 +379,7 @@ def cancel_registration(reg_id):
         flash(f'Registration for {registration.user.username} to {registration.event.title} is already cancelled.', 'info')
         return redirect(url_for('admin.manage_registrations'))
 
-    registration.status = RegistrationStatus.CANCELLED
+    registration_service.set_status(registration, RegistrationStatus.CANCELLED) # Frees the seat for the waitlist
     db.session.commit()
 
     # Send in-app notification (REMAINS)
@@ -255,6 +392,64 @@ def cancel_registration(reg_id):
     flash(f'Registration for {registration.user.username} to {registration.event.title} cancelled!', 'info')
     return redirect(url_for('admin.manage_registrations'))
 
+_LIVE_STATUSES = (RegistrationStatus.PENDING, RegistrationStatus.APPROVED, RegistrationStatus.WAITLISTED)
+
+# action -> (new status, past tense for the flash, notification text, statuses it applies to).
+# Cancelled registrations are never brought back by a bulk action.
+BULK_REGISTRATION_ACTIONS = {
+    'approve': (RegistrationStatus.APPROVED, 'approved', 'has been APPROVED!',
+                (RegistrationStatus.PENDING, RegistrationStatus.WAITLISTED)),
+    'reject': (RegistrationStatus.CANCELLED, 'rejected', 'has been REJECTED. Please contact the organizer for details.',
+               _LIVE_STATUSES),
+    'cancel': (RegistrationStatus.CANCELLED, 'cancelled', 'has been CANCELLED.', _LIVE_STATUSES),
+}
+
+@admin_bp.route('/manage_registrations/bulk/<action>', methods=['POST'])
+@admin_required
+def bulk_update_registrations(action):
+    """
+    Approve/reject/cancel either the checked registrations (registration_ids) or everything
+    matching the list filters (event_id, status, user, date_from, date_to), e.g. all pending
+    for one event. Approve only takes pending registrations, plus waitlisted ones that were
+    checked individually (an override past capacity, like approving one); reject and cancel
+    take any that aren't cancelled yet. One transaction: a single UPDATE plus one batched
+    notification insert. Unreadable ids or filters reject the whole request, rather than
+    being dropped and widening the selection.
+    """
+    if action not in BULK_REGISTRATION_ACTIONS:
+        abort(404)
+    new_status, done, message, from_statuses = BULK_REGISTRATION_ACTIONS[action]
+
+    filter_args = {key: request.form[key] for key in ('event_id', 'status', 'user', 'date_from', 'date_to')
+                   if request.form.get(key)}
+    raw_ids = request.form.getlist('registration_ids')
+    registration_ids = request.form.getlist('registration_ids', type=int)
+    if len(registration_ids) != len(raw_ids):
+        flash('Invalid registration selection; nothing was changed.', 'danger')
+        return redirect(url_for('admin.manage_registrations', **filter_args))
+    if registration_ids:
+        criteria = [Registration.id.in_(registration_ids)]
+    else:
+        filters = _registration_filters(request.form)
+        invalid = _invalid_registration_filters(request.form, filters)
+        if invalid:
+            flash(f"Invalid filter value for {', '.join(invalid)}; nothing was changed.", 'danger')
+            return redirect(url_for('admin.manage_registrations', **filter_args))
+        criteria = _registration_criteria(filters)
+        if new_status == RegistrationStatus.APPROVED:
+            # A filter never seats the waitlist past capacity: they move up as seats are freed
+            from_statuses = tuple(status for status in from_statuses if status != RegistrationStatus.WAITLISTED)
+    if not criteria: # Never touch every registration in the system by accident
+        flash('Select registrations or filter the list before applying a bulk action.', 'warning')
+        return redirect(url_for('admin.manage_registrations', **filter_args))
+
+    changed = registration_service.bulk_set_status(criteria, new_status, message, from_statuses)
+    db.session.commit()
+
+    flash(f'{changed} registration(s) {done}.' if changed
+          else 'No registrations needed changing.', 'success' if changed else 'info')
+    return redirect(url_for('admin.manage_registrations', **filter_args))
+
 # --- Add Notification Sending for Admin Broadcast ---
 # This is where the admin can send a general message to all users.
 # This does NOT send an email, only an in-app notification, as per your preference.
@@ -265,12 +460,16 @@ def send_notification():
     if form.validate_on_submit():
         message = form.message.data
         
-        # Send to all users (basic broadcast) - ONLY IN-APP
-        all_users = User.query.all()
-        for user in all_users:
-            notification = Notification(user_id=user.id, message=message)
-            db.session.add(notification)
+        # Basic broadcast - ONLY IN-APP, inserted set-based by a background worker.
+        # Optionally limited to one role and/or the followers of one organizer.
+        payload = {'message': message, 'role': form.role.data or None, 'followers_of': None}
+        audience = 'all users' if not form.role.data else f'all {Role(form.role.data).name.lower()}s'
+        if form.followers_of.data:
+            organizer = User.query.filter_by(username=form.followers_of.data).first()
+            payload['followers_of'] = organizer.id # Existence checked by the form
+            audience += f' following {organizer.username}'
+        job = enqueue('broadcast_notification', payload, owner_id=current_user.id)
         db.session.commit()
-        flash('Notification sent to all users!', 'success')
+        flash(f'Notification queued for {audience} (job #{job.id}).', 'success')
         return redirect(url_for('admin.admin_dashboard'))
     return render_template('admin/send_notification.html', title='Send Notification', form=form)
\ No newline at end of file
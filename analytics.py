@@ -0,0 +1,153 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import select, String, type_coerce
+
+from extensions import db
+from models import Event, Registration, Rating, Category, RegistrationStatus
+from cache import get_cache
+from jobs import job_handler, result_dir
+
+# Attendance, no-show, rating and cohort metrics computed with pandas over bulk-loaded tables
+# (no per-event ORM loops). Registrations are approved at check-in, so once an event has ended,
+# APPROVED means the attendee showed up and PENDING means they didn't.
+
+AnalyticsReport = namedtuple('AnalyticsReport', ['summary', 'events', 'ratings', 'cohorts', 'generated_at'])
+
+READ_CHUNK_ROWS = 50000 # Rows per read_sql chunk
+SPRING, FALL = 1, 2
+FALL_START_MONTH = 7 # Events from July on belong to the fall semester
+TABLES = ('events', 'ratings', 'cohorts') # Report tables offered as CSV downloads
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _read(statement, conn, columns):
+    chunks = list(pd.read_sql(statement, conn, chunksize=READ_CHUNK_ROWS))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+def load_frames(organizer_id=None):
+    """Bulk-load events, registrations, ratings and categories as DataFrames (optionally one organizer's events)."""
+    events_stmt = select(
+        Event.id, Event.title, Event.organizer_id, Event.category_id,
+        type_coerce(Event.start_time, String).label('start_time'), type_coerce(Event.end_time, String).label('end_time'),
+    )
+    regs_stmt = select(
+        Registration.event_id, Registration.user_id,
+        type_coerce(Registration.status, String).label('status'), # Raw enum names, no per-row conversion
+    )
+    ratings_stmt = select(Rating.event_id, Rating.rating)
+    if organizer_id is not None:
+        event_ids = select(Event.id).where(Event.organizer_id == organizer_id)
+        events_stmt = events_stmt.where(Event.organizer_id == organizer_id)
+        regs_stmt = regs_stmt.where(Registration.event_id.in_(event_ids))
+        ratings_stmt = ratings_stmt.where(Rating.event_id.in_(event_ids))
+
+    with db.engine.connect() as conn:
+        events = _read(events_stmt, conn, ['id', 'title', 'organizer_id', 'category_id', 'start_time', 'end_time'])
+        registrations = _read(regs_stmt, conn, ['event_id', 'user_id', 'status'])
+        ratings = _read(ratings_stmt, conn, ['event_id', 'rating'])
+        categories = _read(select(Category.id, Category.name), conn, ['id', 'name'])
+
+    for column in ('start_time', 'end_time'):
+        events[column] = pd.to_datetime(events[column], format='ISO8601')
+    return events, registrations, ratings, categories
+
+
+def _rate(part, whole):
+    return np.where(whole > 0, part / np.where(whole > 0, whole, 1), np.nan)
+
+
+def semester_codes(timestamps):
+    """'YYYY-1' (spring) or 'YYYY-2' (fall) for a datetime Series; the codes sort chronologically."""
+    semester = np.where(timestamps.dt.month >= FALL_START_MONTH, FALL, SPRING)
+    return timestamps.dt.year.astype(str) + '-' + pd.Series(semester, index=timestamps.index).astype(str)
+
+
+def build_report(organizer_id=None, now=None):
+    events, registrations, ratings, categories = load_frames(organizer_id)
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Per event: one column per registration status
+    counts = pd.crosstab(registrations['event_id'], registrations['status']) \
+        .reindex(columns=[status.name for status in RegistrationStatus], fill_value=0)
+    table = events.set_index('id').join(counts, how='left').fillna({status.name: 0 for status in RegistrationStatus})
+    table[[status.name for status in RegistrationStatus]] = table[[status.name for status in RegistrationStatus]].astype(int)
+    table['category'] = table['category_id'].map(categories.set_index('id')['name'])
+    table['ended'] = table['end_time'] < now
+
+    seated = table['APPROVED'] + table['PENDING']
+    table['attendance_rate'] = np.where(table['ended'], _rate(table['APPROVED'], seated), np.nan)
+    table['no_show_rate'] = np.where(table['ended'], _rate(table['PENDING'], seated), np.nan)
+
+    rating_stats = ratings.groupby('event_id')['rating'].agg(['count', 'mean'])
+    table['rating_count'] = rating_stats['count'].reindex(table.index, fill_value=0).astype(int)
+    table['average_rating'] = rating_stats['mean'].reindex(table.index)
+
+    events_table = table.reset_index().rename(columns={'id': 'event_id'})[[
+        'event_id', 'title', 'category', 'start_time', 'APPROVED', 'PENDING', 'WAITLISTED', 'CANCELLED',
+        'attendance_rate', 'no_show_rate', 'rating_count', 'average_rating',
+    ]].rename(columns=str.lower).sort_values('start_time', ascending=False, ignore_index=True)
+
+    # Rating distribution (1-5 stars) per category, with an overall row
+    rated = ratings.merge(table[['category']], left_on='event_id', right_index=True)
+    ratings_table = pd.crosstab(rated['category'], rated['rating'], margins=True, margins_name='All') \
+        .reindex(columns=[1, 2, 3, 4, 5, 'All'], fill_value=0) if len(rated) else \
+        pd.DataFrame(columns=[1, 2, 3, 4, 5, 'All'])
+    ratings_table.columns = [f'{c} stars' if c != 'All' else 'total' for c in ratings_table.columns]
+
+    # Repeat attendance: attendees grouped by the semester they first attended, counted in each later semester
+    attended = registrations[registrations['status'] == RegistrationStatus.APPROVED.name] \
+        .merge(table.loc[table['ended'], ['start_time']], left_on='event_id', right_index=True)
+    attended = attended.assign(semester=semester_codes(attended['start_time'])).drop_duplicates(['user_id', 'semester'])
+    attended['cohort'] = attended.groupby('user_id')['semester'].transform('min')
+    cohorts_table = attended.pivot_table(index='cohort', columns='semester', values='user_id', aggfunc='count', fill_value=0) \
+        if len(attended) else pd.DataFrame()
+    semesters_per_user = attended.groupby('user_id')['semester'].nunique()
+
+    ended_seated = seated[table['ended']].sum()
+    summary = {
+        'events': int(len(table)),
+        'ended_events': int(table['ended'].sum()),
+        'active_registrations': int(seated.sum()),
+        'attendance_rate': float(table.loc[table['ended'], 'APPROVED'].sum() / ended_seated) if ended_seated else None,
+        'no_show_rate': float(table.loc[table['ended'], 'PENDING'].sum() / ended_seated) if ended_seated else None,
+        'ratings': int(len(ratings)),
+        'average_rating': float(ratings['rating'].mean()) if len(ratings) else None,
+        'attendees': int(len(semesters_per_user)),
+        'repeat_attendees': int((semesters_per_user > 1).sum()), # Attended in two or more semesters
+    }
+    return AnalyticsReport(summary, events_table, ratings_table, cohorts_table, datetime.now(timezone.utc))
+
+
+def get_report(organizer_id=None):
+    """The report for every event (or one organizer's), cached for ANALYTICS_CACHE_TTL seconds."""
+    cache = get_cache('analytics', ttl=current_app.config.get('ANALYTICS_CACHE_TTL', 600), maxsize=64)
+    key = 'all' if organizer_id is None else f'organizer:{organizer_id}'
+    return cache.get_or_set(key, lambda: build_report(organizer_id))
+
+
+def table_csv(report, name):
+    """One report table as CSV text."""
+    frame = getattr(report, name)
+    return frame.to_csv(index=name != 'events')
+
+
+def write_report_xlsx(report, target):
+    """Write the summary and every table of a report to an Excel workbook, one sheet each."""
+    with pd.ExcelWriter(target, engine='openpyxl') as writer:
+        pd.Series(report.summary, name='value').to_frame().to_excel(writer, sheet_name='Summary')
+        report.events.to_excel(writer, sheet_name='Events', index=False)
+        report.ratings.to_excel(writer, sheet_name='Ratings')
+        report.cohorts.to_excel(writer, sheet_name='Cohorts')
+
+
+@job_handler('analytics_report')
+def analytics_report_job(job):
+    """Excel version of the analytics report; the file is served by the jobs result endpoint."""
+    filename = 'analytics.xlsx'
+    write_report_xlsx(get_report(job.payload.get('organizer_id')), os.path.join(result_dir(job), filename))
+    return {'file': filename, 'download_name': job.payload['download_name'], 'mimetype': XLSX_MIMETYPE}
@@ -2,10 +2,7 @@ import os
 from flask import Flask
 from config import Config
 from extensions import db, login_manager, mail
-from models import User, Role, Category # Central models file
-from werkzeug.security import generate_password_hash
 from datetime import datetime, timezone
-import pytz # For datetime localization
 from flask_migrate import Migrate
 
 def create_app(config_class=Config):
@@ -17,15 +14,25 @@ def create_app(config_class=Config):
     except OSError:
         pass
         
+    import database
+    database.configure(app) # Pool sizing; must run before the engine is created
     db.init_app(app)
+    database.init_app(app, db) # SQLite pragmas, BEGIN IMMEDIATE for writes, optional read-only engine
     login_manager.init_app(app)
     mail.init_app(app)
-    migrate = Migrate(app, db)
+    # Batch mode: SQLite can't ALTER constraints in place. Absolute directory so scripts work from any cwd.
+    migrate = Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'), render_as_batch=True)
+
+    import instrumentation
+    instrumentation.init_app(app) # Query counts and Server-Timing headers per request
     
     @app.context_processor
     def inject_now():
         return {'now': datetime.now(timezone.utc)}
 
+    import images
+    app.add_template_global(images.responsive_image) # <picture> with WebP/fallback srcsets for uploads
+
     # Custom Jinja2 Filter for Datetime Localization
     @app.template_filter('localize_datetime')
     def localize_datetime_filter(dt, format='%Y-%m-%d ', tz_name='UTC'):
@@ -35,6 +42,7 @@ def create_app(config_class=Config):
         """
         if dt is None:
             return "" # Handle None datetime objects gracefully
+        import pytz # For datetime localization (imported on first use)
 
         # Ensure dt is timezone-aware. If naive, assume UTC.
         if dt.tzinfo is None:
@@ -53,27 +61,17 @@ def create_app(config_class=Config):
     from auth import auth_bp
     from event_routes import event_bp
     from admin_routes import admin_bp
+    from jobs import jobs_bp
 
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(event_bp) # Assumed default prefix '/' for main blueprint
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
 
-    with app.app_context():
-        db.create_all() # Will create tables if they don't exist
-
-        if not User.query.filter_by(email='admin@example.com').first():
-            admin_user = User(username='admin', email='admin@example.com', role=Role.ADMIN)
-            admin_user.set_password('password')
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Default admin user 'admin@example.com' created.")
+    from commands import register_commands
+    register_commands(app)
 
-        if not Category.query.first():
-            default_categories = ['Academic', 'Social', 'Sport', 'Workshop', 'Conference', 'Concert', 'Festival']
-            for cat_name in default_categories:
-                db.session.add(Category(name=cat_name))
-            db.session.commit()
-            print("Default categories created.")
+    # Schema, search index and default rows are set up by `flask init-db`, not on every process start
 
 
     return app
@@ -1,11 +1,17 @@
 import os
-from flask import Blueprint, render_template, url_for, flash, redirect, request, current_app
+from flask import Blueprint, render_template, url_for, flash, redirect, request, current_app, jsonify
 from werkzeug.security import generate_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from extensions import db
-from models import User, Role, Notification # Corrected import
+from sqlalchemy import select, or_
+from models import User, Role, Notification, Event, Rating # Corrected import
 from forms import RegistrationForm, LoginForm, UpdateAccountForm, ChangePasswordForm, RequestResetForm, ResetPasswordForm # Ensure all forms are imported
 from utils import save_profile_picture # Corrected import
+from pagination import keyset_paginate
+import notifications as notification_service
+import event_cache
+import follow_graph
+import calendars
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -62,6 +68,10 @@ def profile(username):
                 current_user.profile_picture = save_profile_picture(form.profile_picture.data)
             current_user.username = form.username.data
             current_user.email = form.email.data
+            # Cached pages show the organizer and the latest reviewers
+            event_cache.invalidate_events_where(or_(Event.organizer_id == current_user.id, Event.id.in_(
+                select(Rating.event_id).where(Rating.user_id == current_user.id))))
+            calendars.invalidate_events_where(Event.organizer_id == current_user.id)
             db.session.commit()
             flash('Your account has been updated!', 'success')
             return redirect(url_for('auth.profile', username=current_user.username))
@@ -74,7 +84,10 @@ def profile(username):
     print(f"--- DEBUG: URL being sent to template is: {profile_image} ---")
     print(f"--- DEBUG: Form object (None if not current user's profile): {form} ---")
     
-    return render_template('auth/profile.html', title=f"{user.username}'s Profile", form=form, user=user, image_file=profile_image)
+    # Counts come from the denormalized columns, is_following from the viewer's cached followed-id set
+    is_following = current_user.is_authenticated and follow_graph.is_following(current_user.id, user.id)
+    return render_template('auth/profile.html', title=f"{user.username}'s Profile", form=form, user=user, image_file=profile_image,
+                           follower_count=user.follower_count, following_count=user.following_count, is_following=is_following)
 
 @auth_bp.route('/change_password', methods=['GET', 'POST'])
 @login_required
@@ -125,7 +138,7 @@ def follow_user(username):
     if user_to_follow == current_user:
         flash('You cannot follow yourself.', 'warning')
         return redirect(url_for('auth.profile', username=username))
-    if current_user.follow(user_to_follow): # Call the follow method on the User model
+    if follow_graph.follow(current_user.id, user_to_follow.id): # Also bumps both users' counts
         db.session.commit()
         flash(f'You are now following {username}!', 'success')
     else:
@@ -139,7 +152,7 @@ def unfollow_user(username):
     if user_to_unfollow == current_user:
         flash('You cannot unfollow yourself.', 'warning')
         return redirect(url_for('auth.profile', username=username))
-    if current_user.unfollow(user_to_unfollow): # Call the unfollow method on the User model
+    if follow_graph.unfollow(current_user.id, user_to_unfollow.id):
         db.session.commit()
         flash(f'You have unfollowed {username}.', 'success')
     else:
@@ -157,6 +170,7 @@ def delete_account():
     #     return redirect(url_for('auth.profile', username=user.username))
 
     logout_user() # Log out the user immediately
+    follow_graph.remove_user(user.id) # Keeps the other side's follower/following counts right
     db.session.delete(user)
     db.session.commit()
     flash('Your account has been deleted permanently.', 'info')
@@ -165,12 +179,23 @@ def delete_account():
 @auth_bp.route('/notifications')
 @login_required
 def view_notifications():
-    notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.timestamp.desc()).all()
-    
-    # Mark all unread notifications as read when the user views them
-    unread_notifications = Notification.query.filter_by(user_id=current_user.id, is_read=False).all()
-    for notif in unread_notifications:
-        notif.is_read = True
+    # One page at a time, newest first; older pages via the opaque 'cursor' argument
+    notifications_query = Notification.query.filter_by(user_id=current_user.id)
+    pagination_object = keyset_paginate(notifications_query, (Notification.timestamp, Notification.id),
+                                        cursor=request.args.get('cursor'), per_page=20, descending=True)
+    notifications = pagination_object.items
+
+    # Mark only the notifications on this page as read, in one UPDATE.
+    # The loaded objects keep is_read=False, so the template can still highlight them as new.
+    notification_service.mark_read(current_user.id, [n.id for n in notifications if not n.is_read])
     db.session.commit()
 
-    return render_template('auth/notifications.html', title='Your Notifications', notifications=notifications)
\ No newline at end of file
+    return render_template('auth/notifications.html', title='Your Notifications', notifications=notifications, pagination=pagination_object)
+
+@auth_bp.route('/notifications/unread_count')
+@login_required
+def unread_notifications_count():
+    # Polled by the layout's notification badge
+    response = jsonify(unread=notification_service.unread_count(current_user.id))
+    response.headers['Cache-Control'] = 'private, max-age=15'
+    return response
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Benchmark for door check-in throughput.
+
+Creates an event with many pending registrations on a throwaway SQLite database, then checks
+everyone in twice: once one scan at a time through the check-in form, and once through the
+JSON batch endpoint (/event/<id>/check_in/batch). Prints scans/second for both, then resubmits
+the batches to make sure the endpoint is idempotent.
+
+Usage: python bench_checkin.py [--attendees 2000] [--batch-size 200]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from commands import init_db
+from extensions import db
+from models import User, Event, Registration, RegistrationStatus
+import checkin
+from seed_data import make_config, check
+
+
+def create_events(app, attendees):
+    """Two identical events with `attendees` pending registrations each. Returns organizer id and [(event_id, tokens), ...]."""
+    with app.app_context():
+        organizer = User.query.filter_by(email='admin@example.com').first()
+        users = [User(username=f'scan{i}', email=f'scan{i}@example.com', password_hash='x') for i in range(attendees)]
+        db.session.add_all(users)
+        created = []
+        for label in ('single', 'batch'):
+            event = Event(title=f'Check-in bench ({label})', description='Benchmark', location='Main hall',
+                          start_time=datetime.now() + timedelta(days=1), end_time=datetime.now() + timedelta(days=1, hours=2),
+                          max_attendees=attendees, seats_taken=attendees, organizer_id=organizer.id, category_id=1)
+            db.session.add(event)
+            db.session.flush()
+            registrations = [Registration(user_id=u.id, event_id=event.id, status=RegistrationStatus.PENDING) for u in users]
+            db.session.add_all(registrations)
+            db.session.flush()
+            created.append((event.id, [checkin.make_checkin_token(r) for r in registrations]))
+        db.session.commit()
+        return organizer.id, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attendees', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--single-scans', type=int, default=300, help='Scans timed through the one-at-a-time form')
+    args = parser.parse_args()
+
+    app = create_app(make_config(os.path.join(tempfile.mkdtemp(), 'bench.db')))
+    with app.app_context():
+        init_db(create_all=True)
+    organizer_id, ((single_event_id, single_tokens), (batch_event_id, batch_tokens)) = create_events(app, args.attendees)
+
+    client = app.test_client()
+    with client.session_transaction() as session: # Log in as the organizer without going through the form
+        session['_user_id'] = str(organizer_id)
+        session['_fresh'] = True
+    failures = []
+
+    single_tokens = single_tokens[:args.single_scans]
+    started = time.perf_counter()
+    for token in single_tokens:
+        client.post(f'/event/{single_event_id}/check_in', data={'qr_data_input': token})
+    single_elapsed = time.perf_counter() - started
+    print(f'One scan per request: {len(single_tokens)} scans in {single_elapsed:.2f}s '
+          f'({len(single_tokens) / single_elapsed:.0f} scans/s)')
+
+    batches = [batch_tokens[i:i + args.batch_size] for i in range(0, len(batch_tokens), args.batch_size)]
+    started = time.perf_counter()
+    statuses = {}
+    for batch in batches:
+        response = client.post(f'/event/{batch_event_id}/check_in/batch', json={'tokens': batch})
+        for status, count in response.get_json()['summary'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    batch_elapsed = time.perf_counter() - started
+    print(f'Batch endpoint ({args.batch_size} per request): {len(batch_tokens)} scans in {batch_elapsed:.2f}s '
+          f'({len(batch_tokens) / batch_elapsed:.0f} scans/s)')
+    check(f'every scan checked in ({statuses})', statuses == {'checked_in': len(batch_tokens)}, failures)
+
+    # Offline scanners resubmit whatever they could not confirm; nothing should change
+    response = client.post(f'/event/{batch_event_id}/check_in/batch', json={'tokens': batches[0]})
+    check('resubmitted batch is reported as already checked in',
+          response.get_json()['summary'] == {'already_checked_in': len(batches[0])}, failures)
+
+    response = client.post(f'/event/{batch_event_id}/check_in/batch',
+                           json={'tokens': [single_tokens[0], 'forged.token', batch_tokens[0][:-1]]})
+    check('foreign and tampered tokens rejected',
+          [r['status'] for r in response.get_json()['results']] == ['wrong_event', 'invalid', 'invalid'], failures)
+
+    with app.app_context():
+        approved = Registration.query.filter_by(event_id=batch_event_id, status=RegistrationStatus.APPROVED).count()
+        seats_taken = db.session.get(Event, batch_event_id).seats_taken
+    check(f'{approved} registrations approved in the database', approved == len(batch_tokens), failures)
+    check(f'seats_taken unchanged ({seats_taken})', seats_taken == len(batch_tokens), failures)
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark for the following feed: precomputed feed rows vs the naive followers -> events join.
+
+Builds a synthetic campus with seed_data.py (follows go mostly to organizers), fills the feeds
+with feed.rebuild(), then times the first feed page for a sample of users both ways: the naive
+keyset query joining followers to events on every load, and feed.feed_page(). Organizers with
+more than --fanout-limit followers are served by fan-out on read, so both paths are exercised.
+Timings are taken after a warm-up pass, so the feed reads users' followed-id sets from the
+follow graph cache as it would in steady state. Every page of a few users' feeds is compared
+between the two, and the cost of fanning out one new event is reported.
+
+Usage: python bench_feed.py [--users 5000] [--events 600] [--sample 200] [--fanout-limit 500]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.orm import joinedload
+
+from seed_data import create_seeded_app, check
+from extensions import db
+from models import User, Event, FeedItem, followers
+from pagination import keyset_paginate
+import feed
+
+
+def naive_page(user_id, now, cursor=None, per_page=20):
+    """What the feed would be without precomputation: join the follow graph to events on every read."""
+    query = Event.query.options(joinedload(Event.category), joinedload(Event.organizer)) \
+        .join(followers, followers.c.followed_id == Event.organizer_id) \
+        .filter(followers.c.follower_id == user_id, Event.start_time >= now)
+    return keyset_paginate(query, (Event.start_time, Event.id), cursor=cursor, per_page=per_page)
+
+
+def time_pages(page_fn, user_ids, counter):
+    latencies, queries = [], []
+    for user_id in user_ids:
+        db.session.expunge_all() # No help from the identity map between users
+        counter[0] = 0
+        started = time.perf_counter()
+        page_fn(user_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter[0])
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))], max(queries)
+
+
+def all_pages(page_fn, user_id):
+    ids, cursor = [], None
+    while True:
+        page = page_fn(user_id, cursor)
+        ids.extend(event.id for event in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=600)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sample', type=int, default=200, help='Users whose first page is timed.')
+    parser.add_argument('--fanout-limit', type=int, default=500, help='FEED_FANOUT_MAX_FOLLOWERS for this run.')
+    args = parser.parse_args()
+
+    app, summary, _ = create_seeded_app(config_overrides={'FEED_FANOUT_MAX_FOLLOWERS': args.fanout_limit},
+                                        users=args.users, events=args.events, seed=args.seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None) # After the rebuild; the seed's 'now' is rounded down to the hour
+    failures = []
+    with app.test_request_context():
+        on_read = db.session.scalar(select(func.count()).where(User.feed_fanout_on_read))
+        feed_rows = db.session.scalar(select(func.count()).select_from(FeedItem))
+        print(f"Dataset: {summary['users']} users, {summary['events']} events, {summary['follows']} follows; "
+              f"{feed_rows} feed rows, {on_read} organizer(s) over {args.fanout_limit} followers served on read")
+
+        # The heaviest readers (most follows) plus a spread of everyone else
+        heavy = list(db.session.scalars(select(followers.c.follower_id).group_by(followers.c.follower_id)
+                                        .order_by(func.count().desc()).limit(args.sample // 2)))
+        everyone = list(db.session.scalars(select(User.id).order_by(User.id)))
+        step = max(1, len(everyone) // (args.sample - len(heavy) or 1))
+        user_ids = heavy + everyone[::step][:args.sample - len(heavy)]
+
+        counter = [0]
+        sa_event.listen(db.engine, 'before_cursor_execute', lambda *a: counter.__setitem__(0, counter[0] + 1))
+        for label, page_fn in (('naive join', lambda user_id: naive_page(user_id, now)),
+                               ('precomputed feed', lambda user_id: feed.feed_page(user_id, now=now))):
+            time_pages(page_fn, user_ids, counter) # Warm the page cache and the followed-id sets
+            p50, p95, queries = time_pages(page_fn, user_ids, counter)
+            print(f'  {label:<18} first page  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  {queries} queries')
+
+        mismatches = [user_id for user_id in user_ids[:20]
+                      if all_pages(lambda u, c: naive_page(u, now, c), user_id)
+                      != all_pages(lambda u, c: feed.feed_page(u, cursor=c, now=now), user_id)]
+        check(f'every page identical to the naive join for {min(20, len(user_ids))} users '
+              f'(mismatches: {mismatches or "none"})', not mismatches, failures)
+
+        # Fan-out on write for one new event by the most-followed organizer still under the limit
+        organizer = User.query.filter(User.feed_fanout_on_read == False).order_by(User.follower_count.desc()).first()
+        event = Event(title='Fan-out bench', description='Benchmark', location='Main Hall',
+                      start_time=now + timedelta(days=3), end_time=now + timedelta(days=3, hours=2),
+                      organizer_id=organizer.id, category_id=1)
+        db.session.add(event)
+        db.session.commit()
+        started = time.perf_counter()
+        written = feed.fan_out_event(event)
+        db.session.commit()
+        print(f'  fan-out on write: {written} feed rows for {organizer.follower_count} followers '
+              f'in {(time.perf_counter() - started) * 1000:.1f} ms')
+        check('new event reached every follower', written == organizer.follower_count, failures)
+        check('fan-out is idempotent (job retries)', feed.fan_out_event(event) == 0, failures)
+        db.session.rollback()
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
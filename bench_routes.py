@@ -0,0 +1,169 @@
+"""
+Route benchmark: p50/p95 latency and SQL query counts for the hot pages, on synthetic data.
+
+Builds a throwaway database with seed_data.py, then times each route with the Flask test client
+(the response body is read in full, so streamed exports are included) and counts the SQL
+statements each request runs. Results are compared against a stored baseline
+(bench_routes_baseline.json): any route running more queries than its baseline fails, and
+latency changes are reported. Timings only compare across runs on the same machine, so they
+fail the run only with --max-slowdown.
+
+When the templates folder is missing, pages are rendered with an empty template: the timings
+then cover the view, the queries and the response, but not Jinja.
+
+Usage: python bench_routes.py [--users 2000] [--events 300] [--requests 30] [--save-baseline]
+                              [--baseline bench_routes_baseline.json] [--max-slowdown 1.5]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from jinja2 import BaseLoader
+from sqlalchemy import event as sa_event
+
+from seed_data import create_seeded_app, percentile, check
+from extensions import db
+from models import Registration, RegistrationStatus
+import checkin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'bench_routes_baseline.json')
+
+
+class EmptyTemplateLoader(BaseLoader):
+    def get_source(self, environment, template):
+        return '', template, lambda: True
+
+
+def build_routes(summary, app):
+    """(name, method, url or callable(i) -> url, data or callable(i) -> data) for every benchmarked route."""
+    event_ids = summary['event_ids']
+    busiest = summary['busiest_event_id']
+    now = summary['now']
+    with app.app_context():
+        # Pending registrations of the busiest event; each check-in request approves the next one
+        pending = Registration.query.filter_by(event_id=busiest, status=RegistrationStatus.PENDING) \
+            .order_by(Registration.id).all()
+        with app.test_request_context():
+            tokens = [checkin.make_checkin_token(registration) for registration in pending]
+
+    return [
+        ('dashboard', 'GET', '/dashboard', None),
+        ('view_event', 'GET', lambda i: f'/event/{event_ids[i * 7 % len(event_ids)]}', None),
+        ('event_calendar', 'GET', f'/event_calendar?year={now.year}&month={now.month}', None),
+        ('organizer_dashboard', 'GET', '/organizer_dashboard', None),
+        ('export_registrations', 'GET', f'/event/{busiest}/export_registrations?format=csv', None),
+        ('check_in', 'POST', f'/event/{busiest}/check_in', lambda i: {'qr_data_input': tokens[i % len(tokens)]}),
+        ('admin.manage_registrations', 'GET', '/admin/manage_registrations', None),
+        ('send_notification', 'POST', '/admin/send_notification', lambda i: {'message': f'Benchmark notice {i}', 'role': ''}),
+    ]
+
+
+def run_route(client, method, url, data, requests, warmup, counter):
+    latencies, queries, statuses = [], [], set()
+    for i in range(warmup + requests):
+        target = url(i) if callable(url) else url
+        form = data(i) if callable(data) else data
+        counter[0] = 0
+        started = time.perf_counter()
+        response = client.open(target, method=method, data=form)
+        response.get_data() # Drain streamed bodies inside the timing
+        elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(counter[0])
+            statuses.add(response.status_code)
+    return {
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'queries': max(queries),
+        'statuses': sorted(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=30, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route first.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline.')
+    parser.add_argument('--max-slowdown', type=float, default=0,
+                        help='Fail if a route\'s p95 exceeds its baseline by this factor (0 = only report).')
+    args = parser.parse_args()
+
+    # Jobs stay queued (no worker): send_notification is timed up to the enqueue, like in production
+    app, summary, _ = create_seeded_app(
+        config_overrides={'WTF_CSRF_ENABLED': False, 'JOBS_RUN_INLINE': False, 'PERF_INSTRUMENTATION': False},
+        users=args.users, events=args.events, seed=args.seed)
+    if not os.path.isdir(os.path.join(app.root_path, app.template_folder)):
+        print('No templates folder: pages are rendered with an empty template (Jinja time excluded).')
+        app.jinja_loader = EmptyTemplateLoader()
+        app.jinja_env.loader = app.jinja_loader
+    print(f"Dataset: {summary['users']} users, {summary['events']} events, {summary['registrations']} registrations "
+          f"({args.requests} requests per route, seed {args.seed})")
+
+    counter = [0]
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute', lambda *a: counter.__setitem__(0, counter[0] + 1))
+
+    client = app.test_client()
+    with client.session_transaction() as session: # Log in as the admin without going through the form
+        session['_user_id'] = str(summary['admin_id'])
+        session['_fresh'] = True
+
+    results = {}
+    print(f"{'route':<28} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}   vs baseline")
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored['routes']
+        dataset = {'users': args.users, 'events': args.events, 'seed': args.seed}
+        if any(stored['dataset'].get(key) != value for key, value in dataset.items()):
+            print(f"Warning: the baseline was recorded on a different dataset ({stored['dataset']}), comparisons are off.")
+
+    failures = []
+    for name, method, url, data in build_routes(summary, app):
+        result = run_route(client, method, url, data, args.requests, args.warmup, counter)
+        results[name] = result
+        previous = baseline.get(name)
+        comparison = ''
+        if previous:
+            change = (result['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0
+            comparison = f"p95 {change:+.0f}%, queries {result['queries'] - previous['queries']:+d}"
+        print(f"{name:<28} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['queries']:>8}   {comparison}")
+
+    print()
+    for name, result in results.items():
+        check(f"{name} responded {result['statuses']}", all(status < 500 for status in result['statuses']), failures)
+        previous = baseline.get(name)
+        if previous:
+            check(f"{name} runs no more queries than the baseline ({result['queries']} vs {previous['queries']})",
+                  result['queries'] <= previous['queries'], failures)
+            if args.max_slowdown:
+                check(f"{name} p95 within {args.max_slowdown}x of the baseline",
+                      result['p95_ms'] <= previous['p95_ms'] * args.max_slowdown, failures)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'dataset': {'users': args.users, 'events': args.events, 'seed': args.seed,
+                                   'requests': args.requests}, 'routes': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+    elif not baseline:
+        print(f'No baseline at {args.baseline}; run with --save-baseline to create one.')
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
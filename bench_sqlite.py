@@ -0,0 +1,128 @@
+"""
+Concurrent read/write benchmark for the SQLite settings in config.SQLITE_PRAGMAS.
+
+Runs the same mixed workload twice, each time on a fresh throwaway database: once with SQLite's
+defaults (rollback journal, synchronous=FULL, no explicit busy timeout, implicit BEGIN) and once
+with the tuned settings (WAL, synchronous=NORMAL, busy_timeout, mmap, bigger page cache,
+BEGIN IMMEDIATE for writing requests). Reader processes do dashboard-style GETs and writer
+processes register users for events, like gunicorn workers would. For each run it prints
+operations/second, p50/p95 latency and how many operations failed with "database is locked".
+
+Usage: python bench_sqlite.py [--readers 6] [--writers 2] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from app import create_app
+from commands import init_db
+from config import Config
+from extensions import db
+from models import User, Event, Registration
+import registrations as registration_service
+from seed_data import make_config, percentile
+
+USERS = 2000
+EVENTS = 200
+
+SETTINGS = {
+    'defaults': {'SQLITE_PRAGMAS': {}, 'SQLITE_BEGIN_IMMEDIATE': False},
+    'tuned': {'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS, 'SQLITE_BEGIN_IMMEDIATE': True},
+}
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            dict(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='x', role='STUDENT',
+                 profile_picture='default.jpg') for i in range(USERS)])
+        start = datetime.now() + timedelta(days=1)
+        db.session.execute(Event.__table__.insert(), [
+            dict(title=f'Event {i}', description='Benchmark event ' * 20, location='Main hall',
+                 start_time=start + timedelta(hours=i), end_time=start + timedelta(hours=i + 2),
+                 poster='default_event_poster.jpg', organizer_id=1, category_id=i % 7 + 1, max_attendees=500,
+                 seats_taken=0, rating_count=0, rating_sum=0) for i in range(EVENTS)])
+        db.session.commit()
+
+
+def read_once():
+    with db.session.no_autoflush:
+        offset = random.randrange(0, EVENTS - 9)
+        events = Event.query.options(joinedload(Event.category)).order_by(Event.start_time.asc()).offset(offset).limit(9).all()
+        db.session.query(Registration.event_id, func.count(Registration.id)) \
+            .filter(Registration.event_id.in_([e.id for e in events])).group_by(Registration.event_id).all()
+
+
+def write_once():
+    event = db.session.get(Event, random.randrange(1, EVENTS + 1))
+    registration_service.register_user(event, random.randrange(2, USERS + 2))
+
+
+def worker(app, role, seconds, queue):
+    random.seed(os.getpid())
+    operation, method = (read_once, 'GET') if role == 'reader' else (write_once, 'POST')
+    latencies, locked = [], 0
+    with app.app_context():
+        db.engine.dispose(close=False) # Never share pooled connections inherited across fork()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        with app.test_request_context('/', method=method):
+            started = time.perf_counter()
+            try:
+                operation()
+                db.session.commit()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+            finally:
+                db.session.remove()
+    queue.put((role, latencies, locked))
+
+
+def run(name, overrides, args):
+    app = create_app(make_config(os.path.join(tempfile.mkdtemp(), f'{name}.db'), **overrides))
+    with app.app_context():
+        init_db(create_all=True)
+    seed(app)
+    with app.app_context():
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    roles = ['reader'] * args.readers + ['writer'] * args.writers
+    processes = [context.Process(target=worker, args=(app, role, args.seconds, queue)) for role in roles]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print(f'{name}:')
+    for role in ('reader', 'writer'):
+        latencies = [l for r, ls, _ in results if r == role for l in ls]
+        locked = sum(n for r, _, n in results if r == role)
+        print(f'  {role}s: {len(latencies) / args.seconds:8.0f} ops/s   p50 {percentile(latencies, 0.50) * 1000:6.1f} ms'
+              f'   p95 {percentile(latencies, 0.95) * 1000:7.1f} ms   locked errors: {locked}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    print(f'{args.readers} reader and {args.writers} writer processes, {args.seconds:g}s per run')
+    for name, overrides in SETTINGS.items():
+        run(name, overrides, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark for worker startup: import time, create_app() time and time to first request.
+
+Each run is a fresh interpreter (like a newly forked/autoscaled worker) against an already
+initialized throwaway SQLite database. Also checks that the heavy optional libraries (pandas,
+openpyxl, qrcode, Pillow) are not imported by startup or by an ordinary first request, and
+can list the slowest imports as reported by `python -X importtime`.
+
+Usage: python bench_startup.py [--runs 5] [--top 15] [--max-total-ms 0] [--json]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from app import create_app
+from commands import init_db
+from seed_data import make_config, check
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'qrcode', 'PIL')
+FIRST_REQUEST = '/statistics/charts.json' # Routing, a DB connection and a couple of queries, no template
+
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.environ['BENCH_APP_DIR'])
+from app import create_app
+from config import Config
+imported = time.perf_counter()
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.environ['BENCH_DB']
+    TESTING = True
+
+app = create_app(BenchConfig)
+created = time.perf_counter()
+status = app.test_client().get(os.environ['BENCH_URL']).status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - start) * 1000,
+    'status': status,
+    'heavy_loaded': sorted(m for m in os.environ['BENCH_HEAVY'].split(',') if m in sys.modules),
+}))
+'''
+
+
+def run_child(env, extra_args=()):
+    result = subprocess.run([sys.executable, *extra_args, '-c', CHILD], env=env, cwd=tempfile.gettempdir(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """(cumulative_us, module) for the imports with the largest cumulative time, down to the app's own imports' imports."""
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        if match and len(match.group(2)) <= 5: # Two levels of nesting; deeper ones are counted in their parents
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start.')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list (0 to skip).')
+    parser.add_argument('--max-total-ms', type=float, default=0, help='Fail if the median time to first response exceeds this.')
+    parser.add_argument('--json', action='store_true', help='Print the medians as JSON (for tracking over time).')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'startup.db')
+    app = create_app(make_config(db_path))
+    with app.app_context():
+        init_db(create_all=True)
+
+    env = dict(os.environ, BENCH_APP_DIR=HERE, BENCH_DB=db_path, BENCH_URL=FIRST_REQUEST, BENCH_HEAVY=','.join(HEAVY_MODULES))
+    run_child(env) # Warm the OS file cache and __pycache__ so every measured run starts equal
+    runs = [run_child(env)[0] for _ in range(args.runs)]
+
+    medians = {key: statistics.median(run[key] for run in runs)
+               for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms')}
+    if args.json:
+        print(json.dumps({'runs': args.runs, **{key: round(value, 1) for key, value in medians.items()}}))
+    else:
+        print(f'Startup over {args.runs} fresh interpreters (median / min):')
+        for key, label in (('import_ms', 'import app'), ('create_app_ms', 'create_app()'),
+                           ('first_request_ms', f'first request ({FIRST_REQUEST})'), ('total_ms', 'total')):
+            print(f'  {label:<45} {medians[key]:8.1f} ms  {min(run[key] for run in runs):8.1f} ms')
+
+    if args.top:
+        _, stderr = run_child(env, ('-X', 'importtime'))
+        print('Slowest imports:')
+        for cumulative_us, module in slowest_imports(stderr, args.top):
+            print(f'  {cumulative_us / 1000:8.1f} ms  {module}')
+
+    failures = []
+    check(f'first request answered ({runs[0]["status"]})', all(run['status'] == 200 for run in runs), failures)
+    loaded = sorted({module for run in runs for module in run['heavy_loaded']})
+    check(f"no heavy optional modules loaded at startup ({', '.join(loaded) or 'none'})", not loaded, failures)
+    if args.max_total_ms:
+        check(f"time to first response within {args.max_total_ms:.0f} ms", medians['total_ms'] <= args.max_total_ms, failures)
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
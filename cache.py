@@ -0,0 +1,183 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event as sa_event
+
+from extensions import db
+
+_MISSING = object()
+_PENDING_KEY = 'cache_delete_on_commit'
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache: entries expire after `ttl` seconds and the least
+    recently used entry is evicted once `maxsize` is reached. Each process has its own copy,
+    so keep TTLs short for anything other processes can change.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+
+class SQLiteCache:
+    """
+    Cache shared by every worker process on the machine, kept in its own SQLite file so a
+    delete from one worker is seen by all of them. Values are pickled. Each cache has a
+    namespace, so several caches can share one file. Once a namespace holds more than
+    `maxsize` entries, the entries closest to expiring are evicted first.
+    """
+
+    _TRIM_EVERY = 100 # Sets between eviction passes
+
+    def __init__(self, path, namespace, maxsize=10000, ttl=60):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expiry ON cache_entry (namespace, expires_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid(): # Not shared across fork()
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF') # It's a cache; losing it in a crash is fine
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connect().execute(
+            'SELECT value FROM cache_entry WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.namespace, str(key), time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, str(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+            )
+        self._sets += 1
+        if self._sets % self._TRIM_EVERY == 0:
+            self._trim()
+
+    def _trim(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache_entry WHERE namespace = ? AND expires_at <= ?', (self.namespace, time.time()))
+            conn.execute(
+                'DELETE FROM cache_entry WHERE namespace = ? AND key IN ('
+                'SELECT key FROM cache_entry WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+                (self.namespace, self.namespace, self.maxsize)
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache_entry WHERE namespace = ? AND key = ?', (self.namespace, str(key)))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache_entry WHERE namespace = ?', (self.namespace,))
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+
+def get_cache(namespace, ttl=60, maxsize=1024):
+    """
+    The app's cache for a namespace, created on first use with the backend chosen by
+    CACHE_BACKEND: 'memory' (TTLCache, one per process) or 'sqlite' (SQLiteCache, shared
+    by all workers through CACHE_SQLITE_PATH).
+    """
+    caches = current_app.extensions.setdefault('caches', {})
+    cache = caches.get(namespace)
+    if cache is None:
+        if current_app.config.get('CACHE_BACKEND', 'memory') == 'sqlite':
+            path = current_app.config.get('CACHE_SQLITE_PATH') or os.path.join(current_app.instance_path, 'cache.db')
+            cache = SQLiteCache(path, namespace, maxsize=maxsize, ttl=ttl)
+        else:
+            cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        caches[namespace] = cache
+    return cache
+
+
+def delete_on_commit(get_cache_fn, *keys):
+    """
+    Delete keys from the cache returned by get_cache_fn() once the current DB transaction
+    commits (nothing happens if it rolls back). Deleting only after the commit means a
+    concurrent request can't re-cache the old rows before the change is visible.
+    """
+    pending = db.session.info.setdefault(_PENDING_KEY, {})
+    pending.setdefault(get_cache_fn, set()).update(keys)
+
+
+def _after_commit(session):
+    for get_cache_fn, keys in session.info.pop(_PENDING_KEY, {}).items():
+        cache = get_cache_fn()
+        for key in keys:
+            cache.delete(key)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+sa_event.listen(db.session, 'after_commit', _after_commit)
+sa_event.listen(db.session, 'after_rollback', _after_rollback)
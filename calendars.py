@@ -0,0 +1,211 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from calendar import monthrange
+from flask import current_app, url_for
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import func
+
+from extensions import db
+from models import Event, Registration, RegistrationStatus, Category, User
+from cache import get_cache, delete_on_commit
+
+# Calendar views are served from per-month day indexes: {day_of_month: [CalendarEntry, ...]}.
+# An event is listed on every day it spans, not just its start day. Month indexes are cached
+# and dropped (on commit) when an event in that month is created, edited or deleted, or when
+# its category or organizer is renamed.
+
+# What the calendar templates get instead of Event objects. The Event fields they use keep their
+# names (entry.category.name, entry.organizer.username work as before); the relationships
+# (registrations, ratings) and anything not listed here are not available.
+CalendarEntry = namedtuple('CalendarEntry', [
+    'id', 'title', 'description', 'start_time', 'end_time', 'location', 'poster',
+    'category_id', 'organizer_id',
+    'category', # SimpleNamespace(id, name)
+    'organizer', # SimpleNamespace(id, username)
+    'starts_today', 'ends_today', # False on the continuation days of multi-day events
+])
+
+ICS_CHUNK_EVENTS = 200 # VEVENTs per chunk of a streamed feed
+_FEED_SALT = 'calendar-feed'
+
+
+def _cache():
+    return get_cache('calendar', ttl=current_app.config.get('CALENDAR_CACHE_TTL', 300), maxsize=240)
+
+
+def _month_bounds(year, month):
+    start = datetime(year, month, 1)
+    return start, start + timedelta(days=monthrange(year, month)[1])
+
+
+def _last_day(event):
+    # An event ending exactly at midnight doesn't occupy the next day
+    end = event.end_time if event.end_time > event.start_time else event.start_time
+    if end.time() == time(0) and end > event.start_time:
+        end -= timedelta(microseconds=1)
+    return end.date()
+
+
+def build_month_index(year, month):
+    """Bucket every event overlapping the month under each of its days. One range query."""
+    month_start, month_end = _month_bounds(year, month)
+    events = db.session.query(
+        Event.id, Event.title, Event.description, Event.start_time, Event.end_time, Event.location, Event.poster,
+        Event.category_id, Event.organizer_id, Category.name.label('category_name'), User.username.label('organizer_username')
+    ).join(Category, Category.id == Event.category_id).join(User, User.id == Event.organizer_id).filter(
+        Event.start_time < month_end,
+        Event.end_time >= month_start,
+    ).order_by(Event.start_time.asc(), Event.id.asc()).all()
+
+    index = {}
+    for event in events:
+        category = SimpleNamespace(id=event.category_id, name=event.category_name)
+        organizer = SimpleNamespace(id=event.organizer_id, username=event.organizer_username)
+        first_day, last_day = event.start_time.date(), _last_day(event)
+        day = max(first_day, month_start.date())
+        stop = min(last_day, (month_end - timedelta(days=1)).date())
+        while day <= stop:
+            index.setdefault(day.day, []).append(CalendarEntry(
+                event.id, event.title, event.description, event.start_time, event.end_time, event.location,
+                event.poster, event.category_id, event.organizer_id, category, organizer,
+                day == first_day, day == last_day))
+            day += timedelta(days=1)
+    return index
+
+
+def month_index(year, month):
+    """Cached day index for a month."""
+    return _cache().get_or_set(f'month:{year}-{month:02d}', lambda: build_month_index(year, month))
+
+
+def week_days(day):
+    """The seven (date, [CalendarEntry, ...]) pairs of the Monday-to-Sunday week containing `day`."""
+    monday = day - timedelta(days=day.weekday())
+    days = [monday + timedelta(days=offset) for offset in range(7)]
+    indexes = {(d.year, d.month): month_index(d.year, d.month) for d in days} # At most two months
+    return [(d, indexes[(d.year, d.month)].get(d.day, [])) for d in days]
+
+
+def invalidate_span(start_time, end_time):
+    """Drop the cached months an event covering start_time..end_time appears in (on commit)."""
+    if start_time is None:
+        return
+    end_time = max(end_time or start_time, start_time)
+    keys = []
+    year, month = start_time.year, start_time.month
+    while (year, month) <= (end_time.year, end_time.month):
+        keys.append(f'month:{year}-{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    delete_on_commit(_cache, *keys)
+
+
+def invalidate_events_where(*criteria):
+    """Drop the cached months holding any event matching the criteria (e.g. a renamed category or organizer)."""
+    first, last = db.session.query(func.min(Event.start_time), func.max(Event.end_time)).filter(*criteria).one()
+    if isinstance(first, str): # Aggregates over DateTime come back as text on SQLite
+        first, last = datetime.fromisoformat(first), datetime.fromisoformat(last)
+    invalidate_span(first, last)
+
+
+# --- iCalendar feeds ---
+
+def user_feed_token(user_id):
+    """Secret token for a user's personal feed URL (calendar apps can't send our login cookie)."""
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=_FEED_SALT).dumps(user_id)
+
+
+def user_id_from_feed_token(token):
+    try:
+        return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=_FEED_SALT).loads(token)
+    except BadSignature:
+        return None
+
+
+def _feed_window_start():
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=current_app.config.get('CALENDAR_FEED_PAST_DAYS', 90))
+
+
+def feed_query(user_id=None, category_id=None, organizer_id=None):
+    """Events in a feed: a user's active registrations, a category or an organizer's events (recent and upcoming)."""
+    query = Event.query.filter(Event.end_time >= _feed_window_start())
+    if user_id is not None:
+        query = query.join(Registration, Registration.event_id == Event.id).filter(
+            Registration.user_id == user_id, Registration.status != RegistrationStatus.CANCELLED)
+    if category_id is not None:
+        query = query.filter(Event.category_id == category_id)
+    if organizer_id is not None:
+        query = query.filter(Event.organizer_id == organizer_id)
+    return query
+
+
+def feed_validators(query, member_id=Event.id):
+    """
+    (ETag, Last-Modified) for a feed from one aggregate query, so polling clients that already
+    have the current version get a 304 without any event rows being read. The sum of member_id
+    changes when rows join or leave the feed; updated_at covers edits. A user feed passes
+    Registration.id, so cancelling and re-registering for the same event changes the ETag too.
+    """
+    count, last_modified, id_sum = query.with_entities(
+        func.count(Event.id), func.max(Event.updated_at), func.coalesce(func.sum(member_id), 0)
+    ).order_by(None).one()
+    etag = hashlib.sha256(f'{count}:{last_modified}:{id_sum}'.encode()).hexdigest()[:32]
+    if isinstance(last_modified, str): # Aggregates over DateTime come back as text on SQLite
+        last_modified = datetime.fromisoformat(last_modified)
+    return etag, (last_modified.replace(tzinfo=timezone.utc) if last_modified else None)
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    # RFC 5545: lines longer than 75 octets continue on the next line after a leading space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        cut = 75 if not parts else 74
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80: # Don't split a UTF-8 character
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ') # Stored times are naive UTC
+
+
+def _vevent(event, host):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@{host}',
+        f'DTSTAMP:{_ics_time(event.updated_at)}',
+        f'LAST-MODIFIED:{_ics_time(event.updated_at)}',
+        f'DTSTART:{_ics_time(event.start_time)}',
+        f'DTEND:{_ics_time(max(event.end_time, event.start_time))}',
+        f'SUMMARY:{_escape(event.title)}',
+        f'LOCATION:{_escape(event.location)}',
+        f'DESCRIPTION:{_escape(event.description)}',
+        f"URL:{url_for('main.view_event', event_id=event.id, _external=True)}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_ics(query, calendar_name, host):
+    """Yield an iCalendar document for the feed in chunks of ICS_CHUNK_EVENTS events."""
+    yield ''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Campus Events//Calendar Feed//EN',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', f'X-WR-CALNAME:{_escape(calendar_name)}',
+    ])
+    chunk = []
+    for event in query.order_by(Event.start_time.asc(), Event.id.asc()).yield_per(ICS_CHUNK_EVENTS):
+        chunk.append(_vevent(event, host))
+        if len(chunk) == ICS_CHUNK_EVENTS:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + 'END:VCALENDAR\r\n'
@@ -0,0 +1,102 @@
+"""
+Regression check for N+1 queries on the organizer dashboard.
+
+Builds organizers with very different numbers of events (each with registrations and ratings)
+on a throwaway SQLite database, counts the SQL statements stats.organizer_summary() issues
+for each, and checks the count does not grow with the number of events. Also checks the
+numbers against a naive per-event computation.
+
+Usage: python check_query_counts.py
+Exits with status 1 if any check fails.
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+
+from app import create_app
+from commands import init_db
+from extensions import db
+from models import User, Event, Registration, Rating, RegistrationStatus
+import stats
+from seed_data import make_config, check
+
+EVENT_COUNTS = (1, 10, 200)
+
+
+@contextmanager
+def count_queries():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def make_organizer(index, event_count, attendees):
+    organizer = User(username=f'organizer{index}', email=f'organizer{index}@example.com', password_hash='x')
+    db.session.add(organizer)
+    db.session.flush()
+    for n in range(event_count):
+        event = Event(title=f'Event {index}-{n}', description='Query count check', location='Room 1',
+                      start_time=datetime.now() + timedelta(days=n), end_time=datetime.now() + timedelta(days=n, hours=1),
+                      organizer_id=organizer.id, category_id=1)
+        db.session.add(event)
+        db.session.flush()
+        for a, user in enumerate(attendees[:n % len(attendees) + 1]):
+            db.session.add(Registration(user_id=user.id, event_id=event.id, status=RegistrationStatus.APPROVED))
+            if a % 2 == 0:
+                db.session.add(Rating(user_id=user.id, event_id=event.id, rating=(n + a) % 5 + 1))
+    db.session.flush()
+    Event.recompute_rating_aggregates()
+    db.session.commit()
+    return organizer.id
+
+
+def main():
+    app = create_app(make_config(os.path.join(tempfile.mkdtemp(), 'check.db')))
+    with app.app_context():
+        init_db(create_all=True)
+    failures = []
+    with app.app_context():
+        attendees = [User(username=f'attendee{i}', email=f'attendee{i}@example.com', password_hash='x') for i in range(7)]
+        db.session.add_all(attendees)
+        db.session.flush()
+        organizer_ids = {count: make_organizer(i, count, attendees) for i, count in enumerate(EVENT_COUNTS)}
+
+        query_counts = {}
+        for event_count, organizer_id in organizer_ids.items():
+            db.session.expire_all()
+            with count_queries() as statements:
+                summary = stats.organizer_summary(organizer_id)
+                for event in summary.events: # What the template touches per event
+                    event.category.name
+            query_counts[event_count] = len(statements)
+
+            events = Event.query.filter_by(organizer_id=organizer_id).all()
+            ratings = [r.rating for e in events for r in e.ratings.all()]
+            expected_average = sum(ratings) / len(ratings) if ratings else 0.0
+            check(f'{event_count} events: totals match the per-event computation',
+                  summary.total_events == event_count
+                  and summary.total_registrations == sum(e.registrations.count() for e in events)
+                  and abs(summary.average_rating - expected_average) < 1e-9
+                  and all(summary.event_stats[e.id].registration_count == e.registrations.count() for e in events),
+                  failures)
+
+        print(f'  queries per organizer_summary call: {query_counts}')
+        check('query count is constant as the number of events grows', len(set(query_counts.values())) == 1, failures)
+        check('organizer_summary is a single query', max(query_counts.values()) == 1, failures)
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Index regression check: fails if any route's SQL falls back to a full table scan.
+
+Seeds a throwaway SQLite database, requests the app's main pages (and a few form posts) as an
+admin who also organizes events, records every statement they run, and asks SQLite for each
+statement's EXPLAIN QUERY PLAN. A plan step that is a bare "SCAN <table>" (no index) is a
+failure, except on ALLOWED_SCANS tables and for statements without a WHERE clause (whole-table
+aggregates such as the statistics totals, which have to read everything anyway).
+
+Usage: python check_query_plans.py [-v]
+Exits with status 1 if any full scan is found.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+
+from app import create_app
+from commands import init_db
+from extensions import db
+from models import User, Event, Registration, Rating, Notification, RegistrationStatus, followers
+import checkin
+from seed_data import make_config
+
+ALLOWED_SCANS = {'category'} # A handful of rows, always read whole
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+DERIVED_TABLE = re.compile(r'^anon_\d+$') # A subquery's own (already indexed, LIMITed) result, not a table
+
+
+def seed():
+    admin = User.query.filter_by(email='admin@example.com').first()
+    users = [User(username=f'plan{i}', email=f'plan{i}@example.com', password_hash='x') for i in range(50)]
+    db.session.add_all(users)
+    db.session.flush()
+    now = datetime.now()
+    events = [Event(title=f'Plan event {i}', description='Query plan check', location='Room 2',
+                    start_time=now + timedelta(days=i - 10), end_time=now + timedelta(days=i - 10, hours=2),
+                    max_attendees=20, organizer_id=admin.id, category_id=i % 7 + 1) for i in range(20)]
+    db.session.add_all(events)
+    db.session.flush()
+    for i, user in enumerate(users):
+        for event in events[i % 5::5]:
+            db.session.add(Registration(user_id=user.id, event_id=event.id, status=RegistrationStatus.PENDING))
+            db.session.add(Rating(user_id=user.id, event_id=event.id, rating=i % 5 + 1))
+        db.session.add(Notification(user_id=admin.id, message=f'Hello {i}'))
+        db.session.execute(followers.insert().values(follower_id=user.id, followed_id=admin.id))
+    admin_registration = Registration(user_id=admin.id, event_id=events[0].id)
+    db.session.add(admin_registration)
+    db.session.flush()
+    Event.recompute_rating_aggregates()
+    Event.recompute_seats_taken()
+    db.session.commit()
+    return admin.id, events[0].id, admin_registration
+
+
+def requests_to_make(event_id, past_event_id, registration_id, token):
+    return [
+        ('GET', '/dashboard', None),
+        ('GET', '/dashboard?category=2', None),
+        ('GET', '/dashboard?search=plan', None),
+        ('GET', '/dashboard?cursor=', None),
+        ('GET', '/dashboard?sort=top_rated', None),
+        ('GET', f'/event/{event_id}', None),
+        ('GET', '/event_calendar', None),
+        ('GET', '/my_registrations', None),
+        ('GET', '/my_registrations?cursor=', None),
+        ('GET', '/statistics', None),
+        ('GET', '/organizer_dashboard', None),
+        ('GET', f'/event/{event_id}/check_in', None),
+        ('POST', f'/event/{event_id}/check_in', {'qr_data_input': token}),
+        ('GET', f'/event/{registration_id}/qrcode', None),
+        ('GET', f'/event/{event_id}/export_registrations?format=csv', None),
+        ('POST', f'/register_for_event/{event_id + 1}', {}),
+        ('POST', f'/unregister_from_event/{event_id + 1}', {}),
+        ('POST', f'/event/{past_event_id}/rate', {'rating': '4', 'comment': 'ok'}),
+        ('GET', '/auth/profile/plan1', None),
+        ('POST', '/auth/follow/plan1', {}),
+        ('POST', '/auth/unfollow/plan1', {}),
+        ('GET', '/auth/notifications', None),
+        ('GET', '/feed', None),
+        ('GET', '/auth/notifications/unread_count', None),
+        ('GET', '/admin/dashboard', None),
+        ('GET', '/admin/manage_users', None),
+        ('GET', '/admin/manage_users?cursor=', None),
+        ('GET', '/admin/manage_registrations', None),
+        ('GET', f'/admin/manage_registrations?event_id={event_id}&status=pending', None),
+        ('POST', '/admin/manage_registrations/bulk/approve', {'event_id': event_id + 2, 'status': 'pending'}),
+        ('POST', '/admin/manage_registrations/bulk/cancel', {'event_id': event_id + 3}),
+        ('GET', '/admin/manage_categories', None),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every plan, not just the failures')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'plans.db')
+    # PROPAGATE_EXCEPTIONS off: a failing page shows up as a 500 below instead of stopping the run
+    app = create_app(make_config(db_path, TESTING=False, WTF_CSRF_ENABLED=False, PROPAGATE_EXCEPTIONS=False))
+    with app.app_context():
+        init_db(create_all=True)
+    with app.app_context():
+        admin_id, event_id, registration = seed()
+        token = checkin.make_checkin_token(registration)
+        registration_id = registration.id
+        past_event_id = event_id # Seeded events start ten days ago
+
+    captured = [] # (route, statement, parameters)
+    current_route = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_route and not executemany:
+            captured.append((current_route[0], statement, parameters))
+
+    client = app.test_client()
+    with client.session_transaction() as session: # Log in without going through the form
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+
+    with app.app_context():
+        sa_event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    for method, url, data in requests_to_make(event_id, past_event_id, registration_id, token):
+        current_route[:] = [f'{method} {url}']
+        response = client.open(url, method=method, data=data)
+        response.close()
+        print(f'  {response.status_code} {method} {url}')
+    current_route.clear()
+
+    plans = sqlite3.connect(db_path)
+    failures = []
+    seen = set()
+    for route, statement, parameters in captured:
+        if statement.lstrip().upper().startswith(('BEGIN', 'PRAGMA', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')):
+            continue
+        if (statement, route) in seen:
+            continue
+        seen.add((statement, route))
+        steps = [row[3] for row in plans.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())]
+        scanned = [m.group(1) for m in map(FULL_SCAN.match, steps)
+                   if m and m.group(1) not in ALLOWED_SCANS and not DERIVED_TABLE.match(m.group(1))]
+        whole_table = not re.search(r'\bWHERE\b', statement, re.IGNORECASE)
+        if scanned and not whole_table:
+            failures.append((route, statement, steps))
+        elif args.verbose:
+            print(f'\n{route}\n  {" ".join(statement.split())[:200]}\n    ' + '\n    '.join(steps))
+
+    for route, statement, steps in failures:
+        print(f'\nFULL SCAN in {route}:\n  {" ".join(statement.split())}\n    ' + '\n    '.join(steps))
+    print(f'\nChecked {len(seen)} distinct statements.')
+    if failures:
+        print(f'{len(failures)} statement(s) scan a whole table.')
+        sys.exit(1)
+    print('No full table scans.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import update
+
+from extensions import db
+from models import Event, Registration, User, RegistrationStatus
+from jobs import job_handler, result_dir, report_progress
+
+# Check-in tokens are "<registration_id>-<event_id>-<user_id>.<HMAC>", signed with SECRET_KEY.
+# Door staff can trust the ids inside without a DB lookup, and nobody can forge one.
+CheckinClaims = namedtuple('CheckinClaims', ['registration_id', 'event_id', 'user_id'])
+
+_SALT = 'registration-checkin'
+
+MAX_BATCH_SIZE = 1000 # Tokens accepted per batch check-in request
+_ID_CHUNK = 500 # Keeps IN (...) lists well under SQLite's bound-parameter limit
+
+
+def _signer():
+    return Signer(current_app.config['SECRET_KEY'], salt=_SALT)
+
+
+def make_checkin_token(registration):
+    return _token_for(registration.id, registration.event_id, registration.user_id)
+
+
+def _token_for(registration_id, event_id, user_id):
+    return _signer().sign(f'{registration_id}-{event_id}-{user_id}').decode()
+
+
+def verify_checkin_token(token):
+    """Return CheckinClaims for a genuine token, or None if it is malformed or forged."""
+    try:
+        payload = _signer().unsign((token or '').strip()).decode()
+        registration_id, event_id, user_id = (int(part) for part in payload.split('-'))
+    except (BadSignature, ValueError):
+        return None
+    return CheckinClaims(registration_id, event_id, user_id)
+
+
+def apply_checkins(event_id, tokens):
+    """
+    Check in a batch of scanned tokens for one event in a single transaction: signatures are
+    verified in memory, the registrations are read with one IN query per chunk, and every
+    pending one is approved with one bulk UPDATE per chunk. Re-submitting the same tokens is safe
+    (they come back as 'already_checked_in'). Returns one result dict per token, in order.
+    The caller commits.
+
+    Result statuses: checked_in, already_checked_in, not_eligible (cancelled/waitlisted),
+    not_found, wrong_event, invalid.
+    """
+    results = []
+    wanted = {} # registration_id -> claimed user_id
+    for token in tokens:
+        claims = verify_checkin_token(token) if isinstance(token, str) else None
+        if claims is None:
+            results.append({'token': token, 'status': 'invalid'})
+        elif claims.event_id != event_id:
+            results.append({'token': token, 'status': 'wrong_event'})
+        else:
+            results.append({'token': token, 'status': None, 'registration_id': claims.registration_id})
+            wanted[claims.registration_id] = claims.user_id
+
+    ids = list(wanted)
+    found = {}
+    for start in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[start:start + _ID_CHUNK]
+        found.update({
+            reg_id: (user_id, status)
+            for reg_id, user_id, status in db.session.query(Registration.id, Registration.user_id, Registration.status)
+            .filter(Registration.event_id == event_id, Registration.id.in_(chunk))
+        })
+
+    to_approve = [reg_id for reg_id, (user_id, status) in found.items()
+                  if status == RegistrationStatus.PENDING and wanted[reg_id] == user_id]
+    for start in range(0, len(to_approve), _ID_CHUNK):
+        db.session.execute(
+            update(Registration)
+            .where(Registration.event_id == event_id, Registration.id.in_(to_approve[start:start + _ID_CHUNK]),
+                   Registration.status == RegistrationStatus.PENDING)
+            .values(status=RegistrationStatus.APPROVED)
+            .execution_options(synchronize_session=False)
+        )
+
+    approved_now = set(to_approve)
+    for result in results:
+        if result['status'] is not None:
+            continue
+        reg_id = result['registration_id']
+        user_id, status = found.get(reg_id, (None, None))
+        if status is None or user_id != wanted[reg_id]:
+            result['status'] = 'not_found' # Deleted, or the id now belongs to someone else
+        elif reg_id in approved_now:
+            result['status'] = 'checked_in'
+        elif status == RegistrationStatus.APPROVED:
+            result['status'] = 'already_checked_in'
+        else:
+            result['status'] = 'not_eligible'
+    return results
+
+
+def render_qr_svg(data):
+    """Render data as an SVG QR code. Module-level so it can run in a process pool."""
+    import qrcode # Imported on first use, not at worker startup
+    import qrcode.image.svg # SVG QR codes
+
+    qr_img = qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage)
+    buffer = io.BytesIO()
+    qr_img.save(buffer)
+    return buffer.getvalue()
+
+
+def qr_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def _cache_path(digest):
+    directory = os.path.join(current_app.instance_path, 'qr_cache', digest[:2])
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{digest}.svg')
+
+
+def cached_qr_svg(token):
+    """
+    Path of the SVG for a token, rendering it only the first time. Files are
+    content-addressed by the token's hash, so the digest doubles as an ETag.
+    Returns (path, digest).
+    """
+    digest = qr_digest(token)
+    path = _cache_path(digest)
+    if not os.path.exists(path):
+        _write_atomically(path, render_qr_svg(token))
+    return path, digest
+
+
+def _write_atomically(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path) # Concurrent writers of the same digest produce identical files
+
+
+@job_handler('event_qr_codes')
+def event_qr_codes_job(job):
+    """Build a ZIP with every registration's QR code for one event, rendering uncached codes in a process pool."""
+    event = db.session.get(Event, job.payload['event_id'])
+    if event is None:
+        raise LookupError(f"Event {job.payload['event_id']} no longer exists")
+
+    rows = db.session.query(Registration.id, Registration.event_id, Registration.user_id, User.username) \
+        .join(User, User.id == Registration.user_id).filter(Registration.event_id == event.id) \
+        .order_by(Registration.id).all()
+    entries = []
+    for reg_id, event_id, user_id, username in rows:
+        token = _token_for(reg_id, event_id, user_id)
+        entries.append((f'{reg_id}_{username}.svg', token, _cache_path(qr_digest(token))))
+
+    missing = [(token, path) for _, token, path in entries if not os.path.exists(path)]
+    if missing:
+        processes = current_app.config.get('QR_RENDER_PROCESSES') or None # None = one per CPU
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for done, ((token, path), svg) in enumerate(zip(missing, pool.map(render_qr_svg, [t for t, _ in missing], chunksize=64)), 1):
+                _write_atomically(path, svg)
+                if done % 500 == 0:
+                    report_progress(job, 90 * done / len(missing))
+
+    filename = 'qr_codes.zip'
+    with zipfile.ZipFile(os.path.join(result_dir(job), filename), 'w', zipfile.ZIP_DEFLATED) as archive:
+        for arcname, _, path in entries:
+            archive.write(path, arcname)
+
+    safe_event_title = "".join([c for c in event.title if c.isalnum() or c in (' ', '.', '_')]).replace(' ', '_')
+    return {'file': filename, 'download_name': f'{safe_event_title}_qr_codes.zip', 'mimetype': 'application/zip', 'count': len(entries)}
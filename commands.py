@@ -0,0 +1,156 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+
+from extensions import db
+from models import Event, User, Role, Category
+import jobs
+
+DEFAULT_CATEGORIES = ['Academic', 'Social', 'Sport', 'Workshop', 'Conference', 'Concert', 'Festival']
+
+jobs_cli = AppGroup('jobs', help='Run and maintain the background job queue.')
+images_cli = AppGroup('images', help='Maintain uploaded posters and avatars.')
+feed_cli = AppGroup('feed', help='Maintain the precomputed following feeds.')
+
+
+@jobs_cli.command('work')
+@click.option('--processes', '-p', default=2, show_default=True, help='Worker processes to fork.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to sleep when the queue is empty.')
+def jobs_work(processes, burst, poll_interval):
+    """Process queued jobs with a pool of worker processes."""
+    click.echo(f'Starting {processes} job worker(s).')
+    jobs.run_worker_pool(current_app._get_current_object(), processes=processes, burst=burst, poll_interval=poll_interval)
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='Remove finished jobs older than this.')
+def jobs_purge(days):
+    """Delete old finished jobs and their result files."""
+    removed = jobs.purge_finished_jobs(older_than_days=days)
+    click.echo(f'Removed {removed} finished jobs.')
+
+
+@images_cli.command('gc')
+@click.option('--dry-run', is_flag=True, help='Only list what would be removed.')
+@click.option('--grace', type=int, default=None, help='Keep files modified within this many seconds (default IMAGE_GC_GRACE_SECONDS).')
+def images_gc(dry_run, grace):
+    """Delete uploaded images no event or user refers to any more."""
+    import images
+    removed = images.collect_garbage(grace_seconds=grace, dry_run=dry_run)
+    for path in removed:
+        click.echo(path)
+    click.echo(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} images.")
+
+
+@images_cli.command('rebuild')
+@click.option('--processes', '-p', type=int, default=None, help='Render processes (default: one per CPU).')
+def images_rebuild(processes):
+    """Move old uploads into the content-addressed store and re-render every image's variants."""
+    import images
+    imported, rendered = images.rebuild(processes=processes)
+    click.echo(f'Imported {imported} old uploads; rendered variants for {rendered} images.')
+
+
+@feed_cli.command('rebuild')
+def feed_rebuild():
+    """Recompute every user's feed from the followers table."""
+    import feed
+    written = feed.rebuild()
+    db.session.commit()
+    click.echo(f'Feeds rebuilt ({written} rows).')
+
+
+@feed_cli.command('prune')
+def feed_prune():
+    """Remove feed rows for events that have already started."""
+    import feed
+    removed = feed.prune()
+    db.session.commit()
+    click.echo(f'Removed {removed} feed rows.')
+
+
+def seed_defaults():
+    """Add the default admin account and categories if they are missing."""
+    if not User.query.filter_by(email='admin@example.com').first():
+        admin_user = User(username='admin', email='admin@example.com', role=Role.ADMIN)
+        admin_user.set_password('password')
+        db.session.add(admin_user)
+        db.session.commit()
+        print("Default admin user 'admin@example.com' created.")
+
+    if not Category.query.first():
+        for cat_name in DEFAULT_CATEGORIES:
+            db.session.add(Category(name=cat_name))
+        db.session.commit()
+        print("Default categories created.")
+
+
+def init_db(create_all=False):
+    """
+    Bring the database up to date: run the migrations (or, with create_all, create the tables
+    from the models and stamp them as current, for throwaway databases), create the FTS5 search
+    index, which migrations don't manage, seed the default rows and build the statistics
+    rollups (so no page view has to). Safe to run again.
+    """
+    import flask_migrate
+    if create_all:
+        db.create_all()
+        flask_migrate.stamp() # Later `flask db upgrade` runs only apply newer revisions
+    else:
+        flask_migrate.upgrade()
+
+    import search
+    search.create_search_index()
+    seed_defaults()
+
+    import stats
+    with db.engine.begin() as conn:
+        stats.refresh_rollups(conn)
+
+
+def register_commands(app):
+    """Attach the project's maintenance commands to `flask`."""
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(feed_cli)
+
+    @app.cli.command('init-db')
+    @click.option('--create-all', is_flag=True, help='Create tables from the models instead of running migrations.')
+    def init_db_command(create_all):
+        """Create or upgrade the schema, build the search index and add the default admin and categories."""
+        tables = inspect(db.engine).get_table_names()
+        if not create_all and tables and 'alembic_version' not in tables:
+            raise click.ClickException('This database was created before migrations; stamp it first (see migrations/README).')
+        init_db(create_all=create_all)
+        click.echo('Database initialized.')
+
+    @app.cli.command('repair-ratings')
+    def repair_ratings():
+        """Backfill/repair Event.rating_count and Event.rating_sum from the Rating table."""
+        touched = Event.recompute_rating_aggregates()
+        db.session.commit()
+        click.echo(f'Rating aggregates recomputed for {touched} events.')
+
+    @app.cli.command('repair-registrations')
+    def repair_registrations():
+        """Backfill/repair Event.seats_taken from the Registration table."""
+        touched = Event.recompute_seats_taken()
+        db.session.commit()
+        click.echo(f'Seat counts recomputed for {touched} events.')
+
+    @app.cli.command('repair-follows')
+    def repair_follows():
+        """Backfill/repair User.follower_count and User.following_count from the followers table."""
+        touched = User.recompute_follow_counts()
+        db.session.commit()
+        click.echo(f'Follow counts recomputed for {touched} users.')
+
+    @app.cli.command('refresh-stats')
+    def refresh_stats():
+        """Rebuild the statistics rollups now (pages otherwise queue a refresh once they are stale)."""
+        import stats
+        with db.engine.begin() as conn:
+            written = stats.refresh_rollups(conn)
+        click.echo(f'Statistics rollups rebuilt ({written} rows).')
@@ -14,9 +14,57 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite tuning (see database.py and bench_sqlite.py)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL', # Readers and the writer no longer block each other
+        'synchronous': 'NORMAL', # Safe with WAL; only fsyncs at checkpoints
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)), # Wait for the write lock instead of failing
+        'cache_size': -20000, # ~20 MB page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_BEGIN_IMMEDIATE = True # Writing requests (POST etc.) take the write lock when their transaction starts
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = 30
+    DB_READ_ONLY_VIEWS = os.environ.get('DB_READ_ONLY_VIEWS') == '1' # Route @read_only GET views to a query-only engine
+    DB_READ_ONLY_URI = os.environ.get('DATABASE_READONLY_URL') # Defaults to the main database
+    DB_READ_ONLY_POOL_SIZE = 10
+
     # Mail server settings
     MAIL_SERVER = 'smtp.googlemail.com'
     MAIL_PORT = 587
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
-    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
\ No newline at end of file
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+
+    # Background jobs (see jobs.py; start workers with `flask jobs work`)
+    JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE') == '1' # Run jobs inside the request instead (no worker needed)
+    JOB_LEASE_SECONDS = 600 # A running job whose worker stops renewing this lease is picked up again
+    JOB_RETRY_BACKOFF_SECONDS = 10 # Doubled after every failed attempt
+
+    # Caches (see cache.py): 'memory' is per process, 'sqlite' is one file shared by all workers
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH') # Defaults to instance/cache.db
+    EVENT_CACHE_TTL = 60 # Seconds; also how stale another worker's in-process copy can get
+    EVENT_CACHE_MAXSIZE = 2000
+    CALENDAR_CACHE_TTL = 300 # Month indexes are also dropped whenever an event in the month changes
+    CALENDAR_FEED_PAST_DAYS = 90 # How far back .ics feeds go
+    FOLLOW_GRAPH_CACHE_TTL = 300 # Followed-id sets, only cached with CACHE_BACKEND='sqlite' (shared, dropped on follow/unfollow)
+    FOLLOW_GRAPH_CACHE_MAXSIZE = 5000
+    FEED_FANOUT_MAX_FOLLOWERS = 1000 # Organizers above this are merged into feeds on read instead of copied
+    FEED_CACHE_TTL = 300 # The set of those organizers
+    STATS_MAX_AGE_SECONDS = 300 # Older rollups are still served, but a refresh job is queued
+    STATS_ROLLUP_DAYS = 365 # Days of per-day registration counts kept in the rollups
+    STATS_CHART_DAYS = 30 # Days shown by the registrations-per-day chart
+    ANALYTICS_CACHE_TTL = 600 # Seconds an analytics report is reused before it is rebuilt
+    IMAGE_GC_GRACE_SECONDS = 3600 # `flask images gc` leaves files this recent alone
+
+    NOTIFICATION_COUNT_TTL = 30 # Seconds an unread-badge count may be served from cache
+    QR_RENDER_PROCESSES = None # Process pool size for batch QR rendering; None = one per CPU
+
+    # Request instrumentation (see instrumentation.py)
+    PERF_INSTRUMENTATION = True # Query/template timing and Server-Timing headers on every response
+    PERF_N_PLUS_ONE_THRESHOLD = 10 # Warn when one statement shape runs more often than this in a request
+    PERF_PAGE = os.environ.get('PERF_PAGE') == '1' # Keep per-endpoint samples and enable /admin/perf
+    PERF_SAMPLES_PER_ENDPOINT = 500
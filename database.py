@@ -0,0 +1,96 @@
+import functools
+from flask import g, request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event as sa_event
+from sqlalchemy.engine import make_url
+
+# SQLite engine setup: pragmas on every new connection (WAL so readers don't block the writer,
+# a busy timeout so writers queue instead of failing), pool sizing, and BEGIN IMMEDIATE for
+# requests that write, so a transaction never has to upgrade its read lock to a write lock
+# halfway through (under WAL that upgrade fails at once with "database is locked").
+# GET views decorated with @read_only can be routed to a separate query-only engine.
+
+_READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def is_sqlite_file(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configure(app):
+    """Fill in pool settings before db.init_app() creates the engine. Explicit SQLALCHEMY_ENGINE_OPTIONS win."""
+    if not is_sqlite_file(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 10))
+    options.setdefault('pool_timeout', app.config.get('DB_POOL_TIMEOUT', 30))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def _install_sqlite_hooks(engine, pragmas, read_only=False, begin_immediate=True):
+    @sa_event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    if read_only:
+        return
+
+    @sa_event.listens_for(engine, 'begin')
+    def begin(conn):
+        # Requests that may write take the write lock up front (waiting up to busy_timeout).
+        # Everything else keeps the sqlite3 module's default: SELECTs run outside a transaction
+        # and BEGIN is only issued before the first write, so no long-lived read snapshot.
+        if begin_immediate and has_request_context() and request.method not in _READ_METHODS:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def init_app(app, db):
+    """Install the SQLite hooks on the app's engines (after db.init_app) and create the read-only engine if enabled."""
+    with app.app_context():
+        if not is_sqlite_file(db.engine.url):
+            return
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS', {}))
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                _install_sqlite_hooks(engine, pragmas, begin_immediate=app.config.get('SQLITE_BEGIN_IMMEDIATE', True))
+
+        if app.config.get('DB_READ_ONLY_VIEWS'):
+            readonly_engine = create_engine(
+                app.config.get('DB_READ_ONLY_URI') or db.engine.url,
+                pool_size=app.config.get('DB_READ_ONLY_POOL_SIZE', 10),
+                max_overflow=app.config.get('DB_MAX_OVERFLOW', 10),
+                pool_timeout=app.config.get('DB_POOL_TIMEOUT', 30),
+            )
+            _install_sqlite_hooks(readonly_engine, {k: v for k, v in pragmas.items() if k != 'journal_mode'}, read_only=True)
+            app.extensions['readonly_engine'] = readonly_engine
+
+
+class RoutingSession(Session):
+    """Session that sends everything to the read-only engine while a @read_only view runs."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('_db_read_only'):
+            readonly_engine = current_app.extensions.get('readonly_engine')
+            if readonly_engine is not None:
+                return readonly_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """
+    Run a GET view against the read-only engine (when DB_READ_ONLY_VIEWS is on). Writes inside
+    the view fail loudly instead of taking the write lock. Other methods use the primary engine.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in _READ_METHODS:
+            g._db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,101 @@
+from collections import namedtuple
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Event, Rating, User
+from cache import get_cache, delete_on_commit
+
+# Read-through cache for the shared part of the event page (event fields, category, organizer,
+# rating and seat aggregates, latest reviews). Per-user bits (your registration, your rating) are never cached.
+# Code that changes any of that calls invalidate_event(); the entry is dropped once the
+# transaction commits, so a concurrent request can't re-cache the old row in between.
+
+
+RECENT_RATINGS = 10 # Reviews shown on the event page; the total is rating_count
+
+RecentRating = namedtuple('RecentRating', 'username profile_picture rating comment timestamp')
+
+
+class CachedEvent:
+    """
+    Picklable snapshot of an Event, and the whole contract of the detail page template:
+    the Event columns, category (id, name), organizer (id, username, profile_picture),
+    seats_taken/seats_left, rating_count/average_rating and recent_ratings (RecentRating
+    tuples, newest first). The relationships (event.ratings, event.registrations) are not
+    there: anything else the page needs has to be added here or passed as its own variable.
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0.0
+        return self.rating_sum / self.rating_count
+
+    @property
+    def seats_left(self):
+        if self.max_attendees is None:
+            return None
+        return max(self.max_attendees - self.seats_taken, 0)
+
+
+def _cache():
+    return get_cache('event_detail', ttl=current_app.config.get('EVENT_CACHE_TTL', 60),
+                     maxsize=current_app.config.get('EVENT_CACHE_MAXSIZE', 2000))
+
+
+def _snapshot(event_id):
+    event = Event.query.options(joinedload(Event.category), joinedload(Event.organizer)) \
+        .filter(Event.id == event_id).first()
+    if event is None:
+        return None
+    return CachedEvent(
+        id=event.id,
+        title=event.title,
+        description=event.description,
+        start_time=event.start_time,
+        end_time=event.end_time,
+        location=event.location,
+        max_attendees=event.max_attendees,
+        poster=event.poster,
+        organizer_id=event.organizer_id,
+        category_id=event.category_id,
+        seats_taken=event.seats_taken,
+        rating_count=event.rating_count,
+        rating_sum=event.rating_sum,
+        category=SimpleNamespace(id=event.category.id, name=event.category.name),
+        organizer=SimpleNamespace(id=event.organizer.id, username=event.organizer.username,
+                                  profile_picture=event.organizer.profile_picture),
+        recent_ratings=tuple(RecentRating(*row) for row in db.session.execute(
+            select(User.username, User.profile_picture, Rating.rating, Rating.comment, Rating.timestamp)
+            .join(User, User.id == Rating.user_id).where(Rating.event_id == event_id)
+            .order_by(Rating.timestamp.desc(), Rating.id.desc()).limit(RECENT_RATINGS)
+        )),
+    )
+
+
+def get_event_detail(event_id):
+    """The cached snapshot for an event, loading it with two queries on a miss. None if it doesn't exist."""
+    cache = _cache()
+    snapshot = cache.get(event_id)
+    if snapshot is None:
+        snapshot = _snapshot(event_id)
+        if snapshot is not None: # Don't cache misses; the id may be created later
+            cache.set(event_id, snapshot)
+    return snapshot
+
+
+def invalidate_event(*event_ids):
+    """Drop these events from the cache when the current transaction commits."""
+    delete_on_commit(_cache, *event_ids)
+
+
+def invalidate_events_where(*criteria):
+    """Invalidate every event matching the criteria (e.g. a renamed category or organizer)."""
+    invalidate_event(*db.session.scalars(db.select(Event.id).where(*criteria)))
+
@@ -1,25 +1,32 @@
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file # Added send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, Response, stream_with_context, jsonify # Added send_file
 from flask_login import login_required, current_user
-from datetime import datetime, timezone
-from calendar import Calendar, monthrange
+from datetime import datetime, timezone, timedelta
+from calendar import Calendar
 from sqlalchemy import func, desc # Added desc
 from sqlalchemy.orm import joinedload, selectinload # Added selectinload
-import io # Added io
-from openpyxl import Workbook # Added Workbook
-from openpyxl.styles import Font, Alignment, PatternFill # Added for Excel styling
-import qrcode # Added qrcode
-import qrcode.image.svg # Added for SVG QR codes
 
 from extensions import db
-from models import Event, User, Rating, Category, Registration, Notification, Role, RegistrationStatus # Corrected import
+from models import Event, User, Rating, Category, Registration, Notification, Role, RegistrationStatus, SEAT_HOLDING_STATUSES # Corrected import
 from forms import EventForm, RatingForm
 from utils import save_event_poster
+import search
+from pagination import keyset_paginate, estimate_row_count
+import registrations as registration_service
+import exports
+import jobs
+import checkin
+import stats
+import event_cache
+import calendars
+import feed
+from database import read_only
 
 event_bp = Blueprint('main', __name__) # Assuming your event routes are under the 'main' blueprint
 
 @event_bp.route('/')
 @event_bp.route('/dashboard')
+@read_only
 def dashboard():
     if not current_user.is_authenticated:
         return redirect(url_for('auth.login'))
@@ -27,15 +34,26 @@ def dashboard():
     page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '').strip()
+    cursor = request.args.get('cursor') # Any 'cursor' arg (even empty) switches to keyset pagination
+    sort = request.args.get('sort')
     
     events_query = Event.query.options(joinedload(Event.category)).order_by(Event.start_time.asc())
 
     if category_id:
         events_query = events_query.filter_by(category_id=category_id)
     if search_query:
-        events_query = events_query.filter(Event.title.ilike(f'%{search_query}%'))
-
-    pagination_object = events_query.paginate(page=page, per_page=9, error_out=False)
+        # Ranked FTS5 match over title, description, location and category.
+        # Keyset pages have to follow (start_time, id), so they keep chronological order.
+        events_query = search.apply_search(events_query, search_query, ranked=cursor is None)
+
+    if cursor is not None:
+        estimated_total = estimate_row_count(Event) if not (category_id or search_query) else None
+        pagination_object = keyset_paginate(events_query, (Event.start_time, Event.id), cursor=cursor,
+                                            per_page=9, total=estimated_total)
+    else:
+        if sort == 'top_rated':
+            events_query = events_query.order_by(None).order_by(Event.average_rating.desc(), Event.start_time.asc())
+        pagination_object = events_query.paginate(page=page, per_page=9, error_out=False)
     categories = Category.query.order_by(Category.name).all()
 
     return render_template('events/dashboard.html', 
@@ -43,12 +61,16 @@ def dashboard():
                            pagination=pagination_object, 
                            categories=categories,
                            selected_category_id=category_id,
-                           search_query=search_query)
+                           search_query=search_query,
+                           sort=sort)
 
 
 @event_bp.route('/event/<int:event_id>')
+@read_only
 def view_event(event_id):
-    event = db.session.get(Event, event_id)
+    # Shared event data comes from the cache; only the per-user lookups below hit the DB.
+    # `event` is an event_cache.CachedEvent, not the model: see its docstring for what the template can use.
+    event = event_cache.get_event_detail(event_id)
     if not event:
         flash('Event not found!', 'danger')
         return redirect(url_for('main.dashboard'))
@@ -106,6 +128,10 @@ def create_event():
             category_id=form.category.data
         )
         db.session.add(event)
+        db.session.flush() # Assigns event.id for the search index
+        search.index_event(event)
+        calendars.invalidate_span(event.start_time, event.end_time)
+        jobs.enqueue('feed_fanout', {'event_id': event.id}, owner_id=current_user.id) # Into followers' feeds
         db.session.commit()
         flash('Event created successfully!', 'success')
         return redirect(url_for('main.view_event', event_id=event.id))
@@ -129,6 +155,7 @@ def edit_event(event_id):
     if form.validate_on_submit():
         if form.poster.data:
             event.poster = save_event_poster(form.poster.data)
+        calendars.invalidate_span(event.start_time, event.end_time) # The months it used to be in
         
         event.title = form.title.data
         event.description = form.description.data
@@ -137,6 +164,13 @@ def edit_event(event_id):
         event.location = form.location.data
         event.max_attendees = form.max_attendees.data if form.max_attendees.data is not None else None
         event.category_id = form.category.data
+        event.updated_at = datetime.now(timezone.utc).replace(tzinfo=None) # For calendar feed validators
+        search.index_event(event)
+        event_cache.invalidate_event(event.id)
+        calendars.invalidate_span(event.start_time, event.end_time)
+        feed.event_moved(event)
+        db.session.flush()
+        registration_service.promote_waitlist(event.id) # No-op unless max_attendees was raised
         db.session.commit()
         flash('Event updated successfully!', 'success')
         return redirect(url_for('main.view_event', event_id=event.id))
@@ -162,6 +196,10 @@ def delete_event(event_id):
         flash('Event not found or you do not have permission to delete it.', 'danger')
         return redirect(url_for('main.dashboard'))
 
+    search.remove_event(event.id)
+    event_cache.invalidate_event(event.id)
+    calendars.invalidate_span(event.start_time, event.end_time)
+    feed.event_removed(event.id)
     db.session.delete(event)
     db.session.commit()
     flash('Event deleted successfully!', 'success')
@@ -184,16 +222,16 @@ def register_for_event(event_id):
         flash('Cannot register for a past event.', 'warning')
         return redirect(url_for('main.view_event', event_id=event.id))
 
-    existing_registration = Registration.query.filter_by(user_id=current_user.id, event_id=event.id).first()
-    if existing_registration:
+    # Seat claim and insert happen in one transaction; full events put the user on the waitlist
+    registration = registration_service.register_user(event, current_user.id)
+    if registration is None:
         flash('You are already registered for this event.', 'warning')
         return redirect(url_for('main.view_event', event_id=event.id))
 
-    registration = Registration(user_id=current_user.id, event_id=event.id, status=RegistrationStatus.PENDING)
-    db.session.add(registration)
-    db.session.commit()
-
-    flash(f'Successfully registered for {event.title}!', 'success')
+    if registration.status == RegistrationStatus.WAITLISTED:
+        flash(f'{event.title} is full. You have been added to the waitlist and will be notified if a seat opens up.', 'info')
+    else:
+        flash(f'Successfully registered for {event.title}!', 'success')
     return redirect(url_for('main.view_event', event_id=event.id))
 
 
@@ -210,7 +248,10 @@ def unregister_from_event(event_id):
     #     flash('Cannot unregister from a past event.', 'warning')
     #     return redirect(url_for('main.view_event', event_id=event_id))
 
+    held_seat = registration.status in SEAT_HOLDING_STATUSES
     db.session.delete(registration)
+    if held_seat:
+        registration_service.release_seat(event_id) # Promotes the next waitlisted registration, if any
     db.session.commit()
     flash('Successfully unregistered from the event.', 'info')
     return redirect(url_for('main.view_event', event_id=event_id))
@@ -235,6 +276,7 @@ def rate_event(event_id):
     if form.validate_on_submit():
         existing_rating = Rating.query.filter_by(user_id=current_user.id, event_id=event.id).first()
         if existing_rating:
+            event.record_rating(form.rating.data, old_value=existing_rating.rating)
             existing_rating.rating = form.rating.data
             existing_rating.comment = form.comment.data
             flash('Your rating has been updated!', 'success')
@@ -246,12 +288,15 @@ def rate_event(event_id):
                 comment=form.comment.data
             )
             db.session.add(rating)
+            event.record_rating(form.rating.data)
             flash('Thank you for rating the event!', 'success')
+        event_cache.invalidate_event(event.id)
         db.session.commit()
     return redirect(url_for('main.view_event', event_id=event.id))
 
 
 @event_bp.route('/event_calendar')
+@read_only
 def event_calendar():
     # Get current year and month from query parameters, or default to current date
     year = request.args.get('year', datetime.now(timezone.utc).year, type=int)
@@ -263,24 +308,8 @@ def event_calendar():
         year = datetime.now(timezone.utc).year
         month = datetime.now(timezone.utc).month
 
-    # Get events for the selected month
-    start_of_month = datetime(year, month, 1, 0, 0, 0, tzinfo=timezone.utc)
-    _, num_days = monthrange(year, month)
-    end_of_month = datetime(year, month, num_days, 23, 59, 59, tzinfo=timezone.utc)
-
-    # Fetch events whose start_time falls within the current month, ordered by start time
-    events_in_month = Event.query.filter(
-        Event.start_time >= start_of_month,
-        Event.start_time <= end_of_month
-    ).order_by(Event.start_time.asc()).all()
-
-    # Organize events by day for easier template rendering
-    events_by_day = {}
-    for event in events_in_month:
-        day = event.start_time.day
-        if day not in events_by_day:
-            events_by_day[day] = []
-        events_by_day[day].append(event)
+    # Events organized by day (multi-day events appear on each day they span), from the cached month index
+    events_by_day = calendars.month_index(year, month)
 
     # Generate calendar days (list of lists representing weeks)
     cal = Calendar()
@@ -313,36 +342,118 @@ def event_calendar():
     )
 
 
+@event_bp.route('/event_calendar/week')
+@read_only
+def event_calendar_week():
+    try:
+        day = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        day = datetime.now(timezone.utc).date()
+
+    days = calendars.week_days(day)
+    return render_template(
+        'events/event_calendar_week.html',
+        title=f"Events for the week of {days[0][0].strftime('%d %B %Y')}",
+        days=days, # [(date, [CalendarEntry, ...]), ...] Monday to Sunday
+        prev_week=(days[0][0] - timedelta(days=7)).isoformat(),
+        next_week=(days[0][0] + timedelta(days=7)).isoformat()
+    )
+
+
+def _ics_response(query, calendar_name, member_id=Event.id):
+    """Stream an .ics feed, or answer 304 from the validators alone when the client is up to date."""
+    etag, last_modified = calendars.feed_validators(query, member_id)
+    response = Response(mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and last_modified.replace(microsecond=0) <= request.if_modified_since):
+        response.status_code = 304
+        return response
+    response.response = stream_with_context(calendars.iter_ics(query, calendar_name, request.host))
+    return response
+
+
+@event_bp.route('/calendar/feed/<token>.ics')
+@read_only
+def user_calendar_feed(token):
+    user_id = calendars.user_id_from_feed_token(token)
+    user = db.session.get(User, user_id) if isinstance(user_id, int) else None
+    if user is None:
+        return Response('Unknown calendar feed', status=404, mimetype='text/plain')
+    return _ics_response(calendars.feed_query(user_id=user.id), f"{user.username}'s events", member_id=Registration.id)
+
+
+@event_bp.route('/calendar/category/<int:category_id>.ics')
+@read_only
+def category_calendar_feed(category_id):
+    category = db.get_or_404(Category, category_id)
+    return _ics_response(calendars.feed_query(category_id=category.id), f'{category.name} events')
+
+
+@event_bp.route('/calendar/organizer/<int:organizer_id>.ics')
+@read_only
+def organizer_calendar_feed(organizer_id):
+    organizer = db.get_or_404(User, organizer_id)
+    return _ics_response(calendars.feed_query(organizer_id=organizer.id), f'Events by {organizer.username}')
+
+
 @event_bp.route('/my_registrations')
 @login_required
+@read_only
 def my_registrations():
-    registrations = Registration.query.filter_by(user_id=current_user.id).order_by(Registration.registration_date.desc()).all()
-    return render_template('events/my_registrations.html', registrations=registrations)
+    registrations_query = Registration.query.filter_by(user_id=current_user.id).order_by(Registration.registration_date.desc())
+    # Subscribable in calendar apps, which can't log in, hence the signed token
+    calendar_feed_url = url_for('main.user_calendar_feed', token=calendars.user_feed_token(current_user.id), _external=True)
 
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        pagination_object = keyset_paginate(registrations_query, (Registration.registration_date, Registration.id),
+                                            cursor=cursor, per_page=20, descending=True)
+        return render_template('events/my_registrations.html', registrations=pagination_object.items, pagination=pagination_object,
+                               calendar_feed_url=calendar_feed_url)
 
-@event_bp.route('/statistics')
-def statistics():
-    total_events = db.session.query(func.count(Event.id)).scalar()
-    total_users = db.session.query(func.count(User.id)).scalar()
-    total_registrations = db.session.query(func.count(Registration.id)).scalar()
+    registrations = registrations_query.all()
+    return render_template('events/my_registrations.html', registrations=registrations, calendar_feed_url=calendar_feed_url)
 
-    # Calculate overall average rating
-    overall_avg_rating_result = db.session.query(func.avg(Rating.rating)).scalar()
-    overall_avg_rating = overall_avg_rating_result if overall_avg_rating_result is not None else 0.0
-    
 
-    # REMOVE: Data queries for individual charts (category_labels, most_registered_labels, etc.)
-    # These are no longer needed if we're not drawing charts.
+@event_bp.route('/feed')
+@login_required
+@read_only
+def following_feed():
+    # Upcoming events from the people you follow, precomputed per user (see feed.py)
+    pagination_object = feed.feed_page(current_user.id, cursor=request.args.get('cursor'), per_page=20)
+    return render_template('events/feed.html', title='Following', events=pagination_object.items,
+                           pagination=pagination_object)
+
+
+@event_bp.route('/statistics')
+@read_only
+def statistics():
+    # Precomputed rollups (see stats.py) instead of counting every table on each view
+    totals = stats.site_totals()
 
     return render_template(
         'events/statistics.html',
         title="Application Statistics",
-        total_events=total_events,
-        total_users=total_users,
-        total_registrations=total_registrations,
-        overall_avg_rating=overall_avg_rating # Pass overall average
+        total_events=totals.events,
+        total_users=totals.users,
+        total_registrations=totals.registrations,
+        overall_avg_rating=totals.average_rating, # Pass overall average
+        stats_refreshed_at=totals.refreshed_at,
+        chart_data_url=url_for('main.statistics_chart_data') # Charts fetch their series from here
     )
 
+
+@event_bp.route('/statistics/charts.json')
+@read_only
+def statistics_chart_data():
+    days = min(max(request.args.get('days', current_app.config.get('STATS_CHART_DAYS', 30), type=int), 1), 365)
+    return jsonify(stats.chart_data(days))
+
 @event_bp.route('/organizer_dashboard')
 @login_required
 def organizer_dashboard():
@@ -350,20 +461,52 @@ def organizer_dashboard():
         flash('You do not have permission to view this page.', 'danger')
         return redirect(url_for('main.dashboard'))
     
-    events = Event.query.filter_by(organizer_id=current_user.id).all()
-    # Calculate stats for organizer dashboard
-    total_organized_events = len(events)
-    total_regs_for_organized_events = sum(event.registrations.count() for event in events)
-    
-    # Calculate average rating across all organized events
-    all_organized_ratings = [rating.rating for event in events for rating in event.ratings.all()]
-    avg_rating_organized = sum(all_organized_ratings) / len(all_organized_ratings) if all_organized_ratings else 0.0
+    # One grouped query for the events, their registration counts and ratings (no per-event queries)
+    summary = stats.organizer_summary(current_user.id)
 
     return render_template('events/organizer_dashboard.html', 
-                           organized_events=events,
-                           total_organized_events=total_organized_events,
-                           total_regs_for_organized_events=total_regs_for_organized_events,
-                           avg_rating_organized=avg_rating_organized)
+                           organized_events=summary.events,
+                           event_stats=summary.event_stats,
+                           total_organized_events=summary.total_events,
+                           total_regs_for_organized_events=summary.total_registrations,
+                           avg_rating_organized=summary.average_rating)
+
+
+@event_bp.route('/organizer_dashboard/analytics')
+@login_required
+def organizer_analytics():
+    if current_user.role not in [Role.ORGANIZER, Role.ADMIN]:
+        flash('You do not have permission to view this page.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Same report as the admin one, limited to this organizer's events
+    import analytics # pandas; only loaded by processes that serve reports
+    report = analytics.get_report(current_user.id)
+    return render_template('events/organizer_analytics.html', title='My Event Analytics', report=report)
+
+
+@event_bp.route('/organizer_dashboard/analytics/export')
+@login_required
+def export_organizer_analytics():
+    if current_user.role not in [Role.ORGANIZER, Role.ADMIN]:
+        flash('You do not have permission to view this page.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    import analytics
+    filename_stem = f"my_event_analytics_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if request.args.get('format') == 'csv':
+        table = request.args.get('table', 'events')
+        if table not in analytics.TABLES:
+            flash('Unknown report table.', 'danger')
+            return redirect(url_for('main.organizer_analytics'))
+        response = Response(analytics.table_csv(analytics.get_report(current_user.id), table), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename_stem}_{table}.csv"'
+        return response
+
+    job = jobs.enqueue('analytics_report', {'organizer_id': current_user.id, 'download_name': f'{filename_stem}.xlsx'},
+                       owner_id=current_user.id)
+    db.session.commit()
+    return jobs.job_accepted_response(job)
 
 
 @event_bp.route('/event/<int:registration_id>/qrcode')
@@ -375,18 +518,27 @@ def get_qrcode(registration_id):
         flash('QR Code not found or you do not have permission to view it.', 'danger')
         return redirect(url_for('main.dashboard'))
 
-    # Data to embed in QR code (e.g., registration ID, a unique token)
-    qr_data = f"registration_id:{registration.id}:user_id:{registration.user.id}:event_id:{registration.event.id}"
-    
-    # Generate QR code as SVG
-    factory = qrcode.image.svg.SvgPathImage
-    qr_img = qrcode.make(qr_data, image_factory=factory)
-    
-    buffer = io.BytesIO()
-    qr_img.save(buffer)
-    buffer.seek(0)
-    
-    return send_file(buffer, mimetype='image/svg+xml', download_name=f'qr_reg_{registration.id}.svg')
+    # Signed check-in token; the SVG is rendered once and then served from the on-disk cache
+    qr_data = checkin.make_checkin_token(registration)
+    svg_path, digest = checkin.cached_qr_svg(qr_data)
+
+    # conditional=True answers If-None-Match with 304, so browsers re-use their copy
+    return send_file(svg_path, mimetype='image/svg+xml', download_name=f'qr_reg_{registration.id}.svg',
+                     etag=digest, conditional=True, max_age=86400)
+
+
+@event_bp.route('/event/<int:event_id>/qrcodes')
+@login_required
+def event_qrcodes(event_id):
+    event = db.session.get(Event, event_id)
+    if not event or (event.organizer_id != current_user.id and current_user.role != Role.ADMIN):
+        flash('Event not found or you do not have permission to download QR codes for this event.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Every attendee's QR code as one ZIP, built by a background worker
+    job = jobs.enqueue('event_qr_codes', {'event_id': event.id}, owner_id=current_user.id)
+    db.session.commit()
+    return jobs.job_accepted_response(job)
 
 
 @event_bp.route('/event/<int:event_id>/check_in', methods=['GET', 'POST'])
@@ -398,11 +550,6 @@ def check_in(event_id):
         flash('Event not found or you do not have permission to access check-in for this event.', 'danger')
         return redirect(url_for('main.dashboard'))
     
-    # Fetch all registrations for this event to display them
-    registrations = Registration.query.filter_by(event_id=event.id).options(
-        selectinload(Registration.user)
-    ).order_by(Registration.registration_date.asc()).all()
-
     if request.method == 'POST':
         # This part handles manual check-in by registration ID or QR data
         reg_id_to_check_in = request.form.get('registration_id_input', type=int)
@@ -412,26 +559,20 @@ def check_in(event_id):
         if reg_id_to_check_in:
             registration_to_update = db.session.get(Registration, reg_id_to_check_in)
         elif qr_data_string:
-            # Parse QR data: e.g., "registration_id:X:user_id:Y:event_id:Z"
-            parts = qr_data_string.split(':')
-            if len(parts) == 6 and parts[0] == 'registration_id' and parts[2] == 'user_id' and parts[4] == 'event_id':
-                try:
-                    scanned_reg_id = int(parts[1])
-                    scanned_event_id = int(parts[5])
-                    if scanned_event_id == event.id: # Ensure QR is for this event
-                        registration_to_update = db.session.get(Registration, scanned_reg_id)
-                    else:
-                        flash('QR code is for a different event.', 'danger')
-                except ValueError:
-                    flash('Invalid QR data format.', 'danger')
+            # Signed token from get_qrcode; the signature proves the ids without a DB lookup
+            claims = checkin.verify_checkin_token(qr_data_string)
+            if claims is None:
+                flash('QR code is not valid.', 'danger')
+            elif claims.event_id != event.id: # Ensure QR is for this event
+                flash('QR code is for a different event.', 'danger')
             else:
-                flash('QR data format not recognized.', 'danger')
+                registration_to_update = db.session.get(Registration, claims.registration_id)
 
         if registration_to_update and registration_to_update.event_id == event.id:
             if registration_to_update.status == RegistrationStatus.APPROVED:
                 flash(f'{registration_to_update.user.username} is already checked in.', 'info')
             else:
-                registration_to_update.status = RegistrationStatus.APPROVED
+                registration_service.set_status(registration_to_update, RegistrationStatus.APPROVED)
                 db.session.commit()
                 flash(f'Successfully checked in {registration_to_update.user.username}!', 'success')
         else:
@@ -439,8 +580,37 @@ def check_in(event_id):
         
         return redirect(url_for('main.check_in', event_id=event.id))
     
+    # Fetch all registrations for this event to display them (only the GET page needs them)
+    registrations = Registration.query.filter_by(event_id=event.id).options(
+        selectinload(Registration.user)
+    ).order_by(Registration.registration_date.asc()).all()
+
     return render_template('events/check_in.html', title=f"Check-in for {event.title}", event=event, registrations=registrations)
 
+@event_bp.route('/event/<int:event_id>/check_in/batch', methods=['POST'])
+@login_required
+def check_in_batch(event_id):
+    # JSON API for door scanners: {"tokens": ["<signed token>", ...]} -> per-token results.
+    # Safe to resubmit (e.g. from offline scanners syncing later).
+    event = db.session.get(Event, event_id)
+    if not event or (event.organizer_id != current_user.id and current_user.role != Role.ADMIN):
+        return jsonify(error='Event not found or you do not have permission to check in attendees.'), 404
+
+    data = request.get_json(silent=True)
+    tokens = data.get('tokens') if isinstance(data, dict) else None # A bare array/string is a bad request too
+    if not isinstance(tokens, list):
+        return jsonify(error='Expected a JSON body like {"tokens": [...]}.'), 400
+    if len(tokens) > checkin.MAX_BATCH_SIZE:
+        return jsonify(error=f'At most {checkin.MAX_BATCH_SIZE} tokens per request.'), 413
+
+    results = checkin.apply_checkins(event.id, tokens)
+    db.session.commit()
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify(event_id=event.id, results=results, summary=summary)
+
 @event_bp.route('/event/<int:event_id>/export_registrations')
 @login_required
 def export_registrations(event_id):
@@ -449,68 +619,24 @@ def export_registrations(event_id):
         flash('Event not found or you do not have permission to export registrations for this event.', 'danger')
         return redirect(url_for('main.dashboard'))
 
-    registrations = Registration.query.filter_by(event_id=event.id).options(joinedload(Registration.user)).order_by(Registration.registration_date.asc()).all()
-
-    if not registrations:
+    if not exports.has_registrations(event.id):
         flash(f'No participants registered for "{event.title}" to export.', 'info')
         return redirect(url_for('main.view_event', event_id=event.id))
 
-    # All of the Excel generation logic needs to be within this block,
-    # so 'output' is guaranteed to be defined if 'registrations' is not empty.
-    try:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"{event.title} Registrations"
-
-        headers = ["Registration ID", "Attendee Username", "Attendee Email", "Registration Date", "Status"]
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        for col_num, header_title in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header_title)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-
-        row_num = 2
-        for reg in registrations:
-            ws.cell(row=row_num, column=1, value=reg.id)
-            ws.cell(row=row_num, column=2, value=reg.user.username)
-            ws.cell(row=row_num, column=3, value=reg.user.email)
-            # Use localize_datetime if you want the Excel export time to be localized
-            # Otherwise, strftime provides consistent string format
-            ws.cell(row=row_num, column=4, value=reg.registration_date.strftime('%Y-%m-%d'))
-            ws.cell(row=row_num, column=5, value=reg.status.value.title())
-            row_num += 1
-        
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if cell.value is not None:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            if adjusted_width > 50: adjusted_width = 50
-            ws.column_dimensions[column].width = adjusted_width
-
-        output = io.BytesIO() # 'output' is defined here
-        wb.save(output)
-        output.seek(0)
-
-        safe_event_title = "".join([c for c in event.title if c.isalnum() or c in (' ', '.', '_')]).replace(' ', '_')
-        filename = f"{safe_event_title}_registrations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return send_file(output, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-    except Exception as e:
-        # Catch any unexpected errors during Excel generation
-        flash(f'An error occurred during export: {e}', 'danger')
-        print(f"ERROR: Excel export failed for event {event.id}: {e}") # Print to console for debugging
-        return redirect(url_for('main.view_event', event_id=event.id))
+    safe_event_title = "".join([c for c in event.title if c.isalnum() or c in (' ', '.', '_')]).replace(' ', '_')
+    filename_stem = f"{safe_event_title}_registrations_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    # CSV is streamed straight from the DB cursor as a chunked response
+    if request.args.get('format') == 'csv':
+        response = Response(stream_with_context(exports.iter_registrations_csv(event.id)), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename_stem}.csv"'
+        return response
+
+    # The Excel file is built by a background worker; the response carries the job id to poll
+    job = jobs.enqueue('export_registrations', {'event_id': event.id, 'download_name': f"{filename_stem}.xlsx"},
+                       owner_id=current_user.id)
+    db.session.commit()
+    return jobs.job_accepted_response(job)
 @event_bp.route('/event/<int:event_id>/gallery')
 def event_gallery(event_id):
     event = db.session.get(Event, event_id)
@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
+from database import RoutingSession
 
 # Instantiate all extensions here
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession}) # Routes @read_only views to the read-only engine
 login_manager = LoginManager()
 mail = Mail()
 
@@ -0,0 +1,184 @@
+import functools
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, exists, literal, union, bindparam, and_, or_
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import User, Event, FeedItem, followers
+from cache import get_cache, delete_on_commit
+from jobs import job_handler
+from pagination import KeysetPagination, encode_cursor, decode_cursor
+
+# "Upcoming events from people I follow". A new event is copied into a FeedItem row per follower
+# by a background job (fan-out on write), so reading a feed is one index range over the reader's
+# own rows. Organizers with more than FEED_FANOUT_MAX_FOLLOWERS followers are switched to
+# fan-out on read instead (User.feed_fanout_on_read, sticky): their events are merged in when
+# the feed is read, which keeps one event from turning into a million inserts.
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _fanout_limit():
+    return current_app.config.get('FEED_FANOUT_MAX_FOLLOWERS', 1000)
+
+
+def _cache():
+    return get_cache('feed', ttl=current_app.config.get('FEED_CACHE_TTL', 300), maxsize=16)
+
+
+def fanout_on_read_organizers():
+    """frozenset of the organizers served by fan-out on read (a handful; cached)."""
+    return _cache().get_or_set('on_read', lambda: frozenset(db.session.scalars(
+        select(User.id).where(User.feed_fanout_on_read))))
+
+
+def fan_out_event(event):
+    """Write event into its organizer's followers' feeds. Returns the rows written. The caller commits."""
+    organizer = db.session.get(User, event.organizer_id)
+    if organizer.feed_fanout_on_read or organizer.follower_count > _fanout_limit():
+        if not organizer.feed_fanout_on_read:
+            organizer.feed_fanout_on_read = True
+            delete_on_commit(_cache, 'on_read')
+        return 0
+    already = select(literal(1)).where(FeedItem.user_id == followers.c.follower_id, FeedItem.event_id == event.id)
+    result = db.session.execute(
+        insert(FeedItem).from_select(
+            ['user_id', 'event_id', 'organizer_id', 'start_time'],
+            select(followers.c.follower_id, literal(event.id), literal(event.organizer_id),
+                   literal(event.start_time, db.DateTime))
+            .where(followers.c.followed_id == event.organizer_id, ~exists(already)) # Idempotent for job retries
+        )
+    )
+    return result.rowcount
+
+
+@job_handler('feed_fanout')
+def feed_fanout_job(job):
+    event = db.session.get(Event, job.payload['event_id'])
+    if event is None:
+        return {'written': 0} # Deleted before the worker got to it
+    written = fan_out_event(event)
+    db.session.commit()
+    return {'written': written}
+
+
+# --- Keeping the rows in step (all in the caller's transaction) ---
+
+def add_follow(user_id, organizer_id):
+    """Backfill a new follower's feed with the organizer's upcoming events."""
+    if db.session.scalar(select(User.feed_fanout_on_read).where(User.id == organizer_id)):
+        return
+    already = select(literal(1)).where(FeedItem.user_id == user_id, FeedItem.event_id == Event.id)
+    db.session.execute(
+        insert(FeedItem).from_select(
+            ['user_id', 'event_id', 'organizer_id', 'start_time'],
+            select(literal(user_id), Event.id, Event.organizer_id, Event.start_time)
+            .where(Event.organizer_id == organizer_id, Event.start_time >= _utcnow(), ~exists(already))
+        )
+    )
+
+
+def remove_follow(user_id, organizer_id):
+    db.session.execute(delete(FeedItem).where(FeedItem.user_id == user_id, FeedItem.organizer_id == organizer_id))
+
+
+def event_moved(event):
+    """Call after an event's start_time changes."""
+    db.session.execute(update(FeedItem).where(FeedItem.event_id == event.id).values(start_time=event.start_time))
+
+
+def event_removed(event_id):
+    db.session.execute(delete(FeedItem).where(FeedItem.event_id == event_id))
+
+
+def user_removed(user_id):
+    db.session.execute(delete(FeedItem).where(or_(FeedItem.user_id == user_id, FeedItem.organizer_id == user_id)))
+
+
+# --- Reading ---
+
+def _after(start_column, id_column, values):
+    """Rows after the cursor's (start_time, id), with start_time as an index range."""
+    return and_(start_column >= values[0],
+                or_(start_column > values[0], and_(start_column == values[0], id_column > values[1])))
+
+
+@functools.lru_cache(maxsize=None)
+def _page_statement(with_pulled, with_cursor):
+    """
+    The feed page SELECT, built once per shape with bound parameters (building the UNION of
+    subqueries costs more Python time than running it).
+    """
+    def page_keys(start_column, id_column, *criteria):
+        keys = select(start_column.label('start_time'), id_column.label('event_id')) \
+            .where(start_column >= bindparam('now', type_=db.DateTime), *criteria)
+        if with_cursor:
+            keys = keys.where(_after(start_column, id_column, (bindparam('after_start', type_=db.DateTime),
+                                                               bindparam('after_id', type_=db.Integer))))
+        return keys.order_by(start_column, id_column).limit(bindparam('limit', type_=db.Integer))
+
+    keys = page_keys(FeedItem.start_time, FeedItem.event_id, FeedItem.user_id == bindparam('user_id')).subquery()
+    if with_pulled:
+        # UNION drops the duplicates: events from before an organizer's switch can come from both sides
+        pulled = page_keys(Event.start_time, Event.id,
+                           Event.organizer_id.in_(bindparam('organizers', expanding=True))).subquery()
+        keys = union(select(keys.c.start_time, keys.c.event_id), select(pulled.c.start_time, pulled.c.event_id)).subquery()
+
+    return select(Event).options(joinedload(Event.category), joinedload(Event.organizer)) \
+        .join(keys, keys.c.event_id == Event.id).order_by(keys.c.start_time, keys.c.event_id) \
+        .limit(bindparam('limit', type_=db.Integer))
+
+
+def feed_page(user_id, cursor=None, per_page=20, now=None):
+    """
+    One page of user_id's feed, soonest first, as a KeysetPagination of Events (forward only:
+    next_cursor, no prev_cursor). Usually a single query: the user's feed rows joined to their
+    events. Following a fan-out-on-read organizer adds one indexed query for their events.
+    """
+    import follow_graph
+    _, values = decode_cursor(cursor, (FeedItem.start_time, FeedItem.event_id))
+    pulled_organizers = follow_graph.followed_ids(user_id) & fanout_on_read_organizers()
+
+    params = {'user_id': user_id, 'now': now or _utcnow(), 'limit': per_page + 1}
+    if values is not None:
+        params.update(after_start=values[0], after_id=values[1])
+    if pulled_organizers:
+        params['organizers'] = sorted(pulled_organizers)
+    statement = _page_statement(bool(pulled_organizers), values is not None)
+    items = db.session.scalars(statement, params).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    next_cursor = encode_cursor('next', (items[-1].start_time, items[-1].id)) if has_more else None
+    return KeysetPagination(items, per_page, next_cursor=next_cursor)
+
+
+# --- Maintenance ---
+
+def prune(before=None):
+    """Delete feed rows for events that have started. Returns the number removed. The caller commits."""
+    return db.session.execute(delete(FeedItem).where(FeedItem.start_time < (before or _utcnow()))).rowcount
+
+
+def rebuild():
+    """
+    Recompute every feed from the followers table: organizers over the fan-out limit are moved
+    to fan-out on read, everyone else's upcoming events are fanned out again. Returns the rows
+    written. The caller commits.
+    """
+    db.session.execute(update(User).where(User.follower_count > _fanout_limit()).values(feed_fanout_on_read=True)
+                       .execution_options(synchronize_session=False))
+    delete_on_commit(_cache, 'on_read')
+    db.session.execute(delete(FeedItem))
+    result = db.session.execute(
+        insert(FeedItem).from_select(
+            ['user_id', 'event_id', 'organizer_id', 'start_time'],
+            select(followers.c.follower_id, Event.id, Event.organizer_id, Event.start_time)
+            .join(Event, Event.organizer_id == followers.c.followed_id)
+            .join(User, User.id == Event.organizer_id)
+            .where(Event.start_time >= _utcnow(), User.feed_fanout_on_read == False)
+        )
+    )
+    return result.rowcount
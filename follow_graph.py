@@ -0,0 +1,106 @@
+from flask import current_app, g, has_request_context
+from sqlalchemy import select, insert, update, delete, exists, literal, or_
+
+from extensions import db
+from models import User, followers
+from cache import get_cache, delete_on_commit
+import feed
+
+# Who-follows-whom, as each user's followed-id set (one indexed query, then O(1) membership
+# checks). The set is memoized on flask.g, so a page calling is_following() for every user it
+# lists costs at most one lookup. With CACHE_BACKEND='sqlite' it is also cached across requests:
+# that cache is shared by every worker, so follow()/unfollow() dropping the entry on commit
+# reaches all of them. A per-process memory cache couldn't be invalidated that way, so the
+# memory backend reads the set once per request instead. follow()/unfollow() also keep
+# User.follower_count/following_count in step.
+
+
+def _cache():
+    """The cross-request cache, or None when it wouldn't be shared between workers."""
+    if current_app.config.get('CACHE_BACKEND', 'memory') != 'sqlite':
+        return None
+    return get_cache('follow_graph', ttl=current_app.config.get('FOLLOW_GRAPH_CACHE_TTL', 300),
+                     maxsize=current_app.config.get('FOLLOW_GRAPH_CACHE_MAXSIZE', 5000))
+
+
+def _request_memo():
+    if not has_request_context():
+        return {}
+    if 'followed_ids' not in g:
+        g.followed_ids = {}
+    return g.followed_ids
+
+
+def followed_ids(user_id):
+    """frozenset of the ids user_id follows."""
+    memo = _request_memo()
+    if user_id not in memo:
+        load = lambda: frozenset(db.session.scalars(
+            select(followers.c.followed_id).where(followers.c.follower_id == user_id)))
+        cache = _cache()
+        memo[user_id] = cache.get_or_set(user_id, load) if cache is not None else load()
+    return memo[user_id]
+
+
+def is_following(user_id, other_id):
+    return other_id in followed_ids(user_id)
+
+
+def following_among(user_id, candidate_ids):
+    """The subset of candidate_ids that user_id follows (e.g. for a list of profile cards)."""
+    return followed_ids(user_id).intersection(candidate_ids)
+
+
+def _forget(*user_ids):
+    memo = _request_memo()
+    for user_id in user_ids:
+        memo.pop(user_id, None)
+    if _cache() is not None:
+        delete_on_commit(_cache, *user_ids)
+
+
+def follow(user_id, other_id):
+    """Make user_id follow other_id. Returns False if it already did. The caller commits."""
+    already = select(literal(1)).where(followers.c.follower_id == user_id, followers.c.followed_id == other_id)
+    added = db.session.execute(
+        insert(followers).from_select(['follower_id', 'followed_id'],
+                                      select(literal(user_id), literal(other_id)).where(~exists(already)))
+    ).rowcount
+    if added:
+        db.session.execute(update(User).where(User.id == user_id).values(following_count=User.following_count + 1))
+        db.session.execute(update(User).where(User.id == other_id).values(follower_count=User.follower_count + 1))
+        feed.add_follow(user_id, other_id)
+        _forget(user_id)
+    return bool(added)
+
+
+def unfollow(user_id, other_id):
+    """Stop user_id following other_id. Returns False if it wasn't. The caller commits."""
+    removed = db.session.execute(
+        delete(followers).where(followers.c.follower_id == user_id, followers.c.followed_id == other_id)
+    ).rowcount
+    if removed:
+        db.session.execute(update(User).where(User.id == user_id, User.following_count > 0)
+                           .values(following_count=User.following_count - 1))
+        db.session.execute(update(User).where(User.id == other_id, User.follower_count > 0)
+                           .values(follower_count=User.follower_count - 1))
+        feed.remove_follow(user_id, other_id)
+        _forget(user_id)
+    return bool(removed)
+
+
+def remove_user(user_id):
+    """
+    Drop every follow to or from a user that is about to be deleted, fixing the counts of the
+    people on the other side. The caller deletes the user and commits.
+    """
+    their_followers = list(db.session.scalars(select(followers.c.follower_id).where(followers.c.followed_id == user_id)))
+    db.session.execute(update(User).where(
+        User.id.in_(select(followers.c.follower_id).where(followers.c.followed_id == user_id)), User.following_count > 0
+    ).values(following_count=User.following_count - 1))
+    db.session.execute(update(User).where(
+        User.id.in_(select(followers.c.followed_id).where(followers.c.follower_id == user_id)), User.follower_count > 0
+    ).values(follower_count=User.follower_count - 1))
+    db.session.execute(delete(followers).where(or_(followers.c.follower_id == user_id, followers.c.followed_id == user_id)))
+    feed.user_removed(user_id)
+    _forget(user_id, *their_followers)
@@ -128,4 +128,10 @@ class SearchUsersForm(FlaskForm):
 
 class NotificationForm(FlaskForm):
     message = TextAreaField('Message', validators=[DataRequired(), Length(max=255)])
-    submit = SubmitField('Send Notification')
\ No newline at end of file
+    role = SelectField('Send to', choices=[('', 'All users')] + [(role.value, f'{role.name.title()}s only') for role in Role], validators=[Optional()])
+    followers_of = StringField('Only followers of (username, optional)', validators=[Optional(), Length(max=150)])
+    submit = SubmitField('Send Notification')
+
+    def validate_followers_of(self, followers_of):
+        if not User.query.filter_by(username=followers_of.data).first():
+            raise ValidationError('There is no user with that username.')
\ No newline at end of file
@@ -0,0 +1,234 @@
+import hashlib
+import io
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, url_for
+from markupsafe import Markup
+
+from extensions import db
+from models import Event, User
+from jobs import job_handler, enqueue
+import event_cache
+
+# Uploaded images are stored by content hash: static/uploads/<kind>/<digest>/ holds the untouched
+# `original` plus one file per variant and format (thumb.webp, thumb.jpg, full.webp, full.jpg).
+# The DB column keeps the full-size fallback path (e.g. uploads/posters/<digest>/full.jpg), so
+# plain url_for('static', filename=...) keeps working. Re-uploading the same bytes reuses the
+# directory, resizing happens in the job worker, and unreferenced directories are removed by
+# `flask images gc`.
+
+KINDS = {
+    # kind: {variant: bounding box}; variants are listed smallest first
+    'posters': {'thumb': (400, 300), 'full': (800, 600)},
+    'avatars': {'thumb': (64, 64), 'full': (256, 256)},
+}
+DIGEST_CHARS = 24 # Keeps the stored path within the 50-character columns
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+LEGACY_DIRS = ('event_posters', 'profile_pictures') # Where uploads went before this pipeline
+# Stock images served straight from static/; rebuild() never imports them. The column defaults,
+# plus the name create_event stores when no poster is uploaded.
+DEFAULT_IMAGES = {
+    'posters': (Event.poster.default.arg, 'default_poster.jpg'),
+    'avatars': (User.profile_picture.default.arg,),
+}
+
+
+def _upload_root(kind):
+    return os.path.join(current_app.root_path, 'static', 'uploads', kind)
+
+
+def _fallback_extension(img):
+    # PNG keeps transparency; everything else falls back to JPEG
+    return 'png' if img.format == 'PNG' else 'jpg'
+
+
+def _write_atomically(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path) # Concurrent writers of the same digest write identical bytes
+
+
+def save_upload(file_storage, kind):
+    """
+    Store an uploaded image and return its static path. Only the header is read here (to check it is
+    an image and pick the fallback format); the variants are rendered by a 'process_image' job.
+    Until then the full-size path serves the original, so the page never shows a broken image.
+    """
+    from PIL import Image # Imported on first use: keeps Pillow out of worker startup
+
+    data = file_storage.read()
+    with Image.open(io.BytesIO(data)) as img: # Lazy: parses the header, doesn't decode pixels
+        extension = _fallback_extension(img)
+    digest = hashlib.sha256(data).hexdigest()[:DIGEST_CHARS]
+    relative_dir = f'uploads/{kind}/{digest}'
+    stored_path = f'{relative_dir}/full.{extension}'
+
+    directory = os.path.join(_upload_root(kind), digest)
+    if os.path.exists(os.path.join(directory, 'original')):
+        os.utime(directory) # Same bytes uploaded before: reuse, and keep it clear of the GC grace window
+        return stored_path
+
+    os.makedirs(directory, exist_ok=True)
+    _write_atomically(os.path.join(directory, 'original'), data)
+    _write_atomically(os.path.join(directory, f'full.{extension}'), data) # Placeholder until the job runs
+    enqueue('process_image', {'kind': kind, 'digest': digest}) # Queued with the caller's commit
+    return stored_path
+
+
+def render_variants(directory, sizes):
+    """
+    Render every variant of directory/original as WebP plus the fallback format. Module-level and
+    app-independent so it can run in a process pool. Returns the number of files written.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(directory, 'original')) as img:
+        extension = _fallback_extension(img)
+        img = ImageOps.exif_transpose(img) # Phone photos are often stored sideways with a rotation tag
+        img.load()
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+
+    if extension == 'jpg':
+        fallback = ('JPEG', 'jpg', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True})
+    else:
+        fallback = ('PNG', 'png', {'optimize': True})
+
+    written = 0
+    for name, box in sizes.items():
+        variant = img.copy()
+        variant.thumbnail(box, Image.Resampling.LANCZOS)
+        for fmt, ext, options in (('WEBP', 'webp', {'quality': WEBP_QUALITY, 'method': 4}), fallback):
+            path = os.path.join(directory, f'{name}.{ext}')
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            (variant.convert('RGB') if fmt == 'JPEG' else variant).save(tmp_path, fmt, **options)
+            os.replace(tmp_path, path)
+            written += 1
+    return written
+
+
+@job_handler('process_image')
+def process_image_job(job):
+    kind, digest = job.payload['kind'], job.payload['digest']
+    directory = os.path.join(_upload_root(kind), digest)
+    if not os.path.exists(os.path.join(directory, 'original')):
+        return {'skipped': True} # Garbage-collected before the worker got to it
+    return {'files': render_variants(directory, KINDS[kind])}
+
+
+# --- Templates ---
+
+def responsive_image(path, sizes='100vw', alt='', css_class='', variant='full'):
+    """
+    <picture> markup for a stored image: a WebP srcset plus a fallback srcset, so the browser
+    downloads the thumbnail for small cards and the full size only where it's displayed large
+    (describe the display width with `sizes`). Images from before this pipeline, or still
+    waiting for their job, get a plain <img>.
+    """
+    attributes = Markup(' alt="{}" class="{}" loading="lazy" decoding="async"').format(alt, css_class)
+    parts = (path or '').split('/')
+    kind = parts[1] if len(parts) == 4 and parts[0] == 'uploads' else None
+    if kind not in KINDS or not os.path.exists(os.path.join(_upload_root(kind), parts[2], f'{variant}.webp')):
+        return Markup('<img src="{}"{}>').format(url_for('static', filename=path), attributes)
+
+    base, extension = f'uploads/{kind}/{parts[2]}', parts[3].rsplit('.', 1)[1]
+
+    def srcset(ext):
+        return ', '.join(f"{url_for('static', filename=f'{base}/{name}.{ext}')} {box[0]}w"
+                         for name, box in KINDS[kind].items())
+
+    return Markup('<picture><source type="image/webp" srcset="{}" sizes="{}">'
+                  '<img src="{}" srcset="{}" sizes="{}"{}></picture>').format(
+        srcset('webp'), sizes, url_for('static', filename=f'{base}/{variant}.{extension}'),
+        srcset(extension), sizes, attributes)
+
+
+# --- Maintenance ---
+
+def _referenced_paths():
+    paths = {poster for (poster,) in db.session.query(Event.poster).distinct()}
+    paths.update(picture for (picture,) in db.session.query(User.profile_picture).distinct())
+    return paths
+
+
+def collect_garbage(grace_seconds=None, dry_run=False):
+    """
+    Delete stored images no event or user points at any more (replaced posters and avatars).
+    Anything modified within the grace period is kept: its row may not be committed yet.
+    Returns the static paths removed (or that would be, with dry_run).
+    """
+    grace_seconds = current_app.config.get('IMAGE_GC_GRACE_SECONDS', 3600) if grace_seconds is None else grace_seconds
+    referenced = _referenced_paths()
+    referenced_dirs = {path.rsplit('/', 1)[0] for path in referenced if path}
+    cutoff = time.time() - grace_seconds
+    removed = []
+
+    for kind in KINDS:
+        root = _upload_root(kind)
+        for digest in (os.listdir(root) if os.path.isdir(root) else []):
+            directory = os.path.join(root, digest)
+            if f'uploads/{kind}/{digest}' in referenced_dirs or os.path.getmtime(directory) > cutoff:
+                continue
+            removed.append(f'uploads/{kind}/{digest}')
+            if not dry_run:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    for legacy in LEGACY_DIRS:
+        root = os.path.join(current_app.root_path, 'static', 'uploads', legacy)
+        for filename in (os.listdir(root) if os.path.isdir(root) else []):
+            path = os.path.join(root, filename)
+            if f'uploads/{legacy}/{filename}' in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            removed.append(f'uploads/{legacy}/{filename}')
+            if not dry_run:
+                os.remove(path)
+    return removed
+
+
+def rebuild(processes=None, on_progress=None):
+    """
+    Move images stored before this pipeline into it (updating the rows that point at them) and
+    re-render every stored image's variants, e.g. after changing KINDS. Rendering runs in a
+    process pool. Returns (imported, rendered).
+    """
+    from PIL import Image
+
+    imported = 0
+    for model, column, kind in ((Event, Event.poster, 'posters'), (User, User.profile_picture, 'avatars')):
+        for (old_path,) in db.session.query(column).filter(
+                ~column.like(f'uploads/{kind}/%'), column.notin_(DEFAULT_IMAGES[kind])).distinct():
+            source = os.path.join(current_app.root_path, 'static', old_path or '')
+            if not old_path or not os.path.isfile(source):
+                continue # Missing files are left alone
+            with open(source, 'rb') as f:
+                data = f.read()
+            with Image.open(source) as img:
+                extension = _fallback_extension(img)
+            digest = hashlib.sha256(data).hexdigest()[:DIGEST_CHARS]
+            directory = os.path.join(_upload_root(kind), digest)
+            os.makedirs(directory, exist_ok=True)
+            _write_atomically(os.path.join(directory, 'original'), data)
+            if model is Event:
+                event_cache.invalidate_events_where(Event.poster == old_path)
+            else:
+                event_cache.invalidate_events_where(Event.organizer_id.in_(
+                    db.session.query(User.id).filter(User.profile_picture == old_path)))
+            db.session.query(model).filter(column == old_path) \
+                .update({column: f'uploads/{kind}/{digest}/full.{extension}'}, synchronize_session=False)
+            imported += 1
+    db.session.commit()
+
+    work = [(os.path.join(_upload_root(kind), digest), KINDS[kind])
+            for kind in KINDS if os.path.isdir(_upload_root(kind))
+            for digest in os.listdir(_upload_root(kind))
+            if os.path.exists(os.path.join(_upload_root(kind), digest, 'original'))]
+    if work:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for done, _ in enumerate(pool.map(render_variants, *zip(*work)), 1):
+                if on_progress:
+                    on_progress(done, len(work))
+    return imported, len(work)
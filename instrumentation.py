@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+# Per-request performance counters: SQL statements and time (from SQLAlchemy engine events),
+# template render time (from Flask signals) and total time. Each response gets a Server-Timing
+# header, repeated statement shapes are logged as likely N+1 queries, and with PERF_PAGE
+# enabled a sample of timings per endpoint is kept for the /admin/perf page.
+
+_IN_LIST = re.compile(r'\(\s*\?(\s*,\s*\?)*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+_samples = defaultdict(deque) # endpoint -> deque of (total_ms, db_ms, template_ms, queries)
+_samples_lock = threading.Lock()
+_engine_hooked = False
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.shapes = Counter()
+        self.warned = set()
+        self.template_starts = []
+
+
+def statement_shape(statement):
+    """Normalize a SQL statement so the same query with different IN-list lengths or literals compares equal."""
+    return _NUMBER.sub('N', _IN_LIST.sub('(?)', ' '.join(statement.split())))
+
+
+def _current():
+    if not has_request_context():
+        return None
+    return g.get('_perf')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start time lives on the execution context, which is dropped with the statement,
+    # so a statement that raises (and never reaches after_cursor_execute) leaves nothing behind
+    if context is not None and _current() is not None:
+        context._perf_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current()
+    started = getattr(context, '_perf_started', None)
+    if stats is None or started is None:
+        return
+    stats.db_seconds += time.perf_counter() - started
+    stats.queries += 1
+
+    shape = statement_shape(statement)
+    stats.shapes[shape] += 1
+    threshold = current_app.config.get('PERF_N_PLUS_ONE_THRESHOLD', 10)
+    if stats.shapes[shape] > threshold and shape not in stats.warned:
+        stats.warned.add(shape)
+        current_app.logger.warning('Possible N+1 in %s: statement ran more than %d times in one request: %s',
+                                   request.endpoint, threshold, shape[:300])
+
+
+def _before_render_template(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None:
+        stats.template_starts.append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    stats = _current()
+    if stats is not None and stats.template_starts:
+        stats.template_seconds += time.perf_counter() - stats.template_starts.pop()
+
+
+def _start_request():
+    g._perf = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop('_perf', None)
+    if stats is None:
+        return response
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    db_ms = stats.db_seconds * 1000
+    template_ms = stats.template_seconds * 1000
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.queries} queries"')
+    response.headers.add('Server-Timing', f'tpl;dur={template_ms:.1f};desc="templates"')
+    response.headers.add('Server-Timing', f'total;dur={total_ms:.1f}')
+
+    if current_app.config.get('PERF_PAGE') and request.endpoint:
+        keep = current_app.config.get('PERF_SAMPLES_PER_ENDPOINT', 500)
+        with _samples_lock:
+            samples = _samples[request.endpoint]
+            samples.append((total_ms, db_ms, template_ms, stats.queries))
+            while len(samples) > keep:
+                samples.popleft()
+    return response
+
+
+def init_app(app):
+    """Hook the counters into an app. Controlled by PERF_INSTRUMENTATION (on by default)."""
+    global _engine_hooked
+    if not app.config.get('PERF_INSTRUMENTATION', True):
+        return
+    if not _engine_hooked:
+        # Class-level listeners cover every engine/bind; they do nothing outside a request
+        sa_event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        sa_event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_hooked = True
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def endpoint_report():
+    """Per-endpoint request count and p50/p95/p99 of total, DB and template time plus query counts, slowest p95 first."""
+    with _samples_lock:
+        snapshot = {endpoint: list(samples) for endpoint, samples in _samples.items()}
+    rows = []
+    for endpoint, samples in snapshot.items():
+        row = {'endpoint': endpoint, 'requests': len(samples)}
+        for index, name in enumerate(('total_ms', 'db_ms', 'template_ms', 'queries')):
+            values = sorted(sample[index] for sample in samples)
+            for pct in (50, 95, 99):
+                row[f'{name}_p{pct}'] = _percentile(values, pct)
+        rows.append(row)
+    rows.sort(key=lambda row: row['total_ms_p95'], reverse=True)
+    return rows
+
+
+def reset_samples():
+    with _samples_lock:
+        _samples.clear()
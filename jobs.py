@@ -0,0 +1,279 @@
+import importlib
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, current_app, jsonify, request, render_template, send_file, abort, url_for, has_request_context
+from flask_login import login_required, current_user
+from sqlalchemy import update, or_, and_, event as sa_event
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Job, JobStatus, Role
+
+# A small local job queue: jobs are rows in the `job` table, claimed by worker processes
+# (`flask jobs work`) with a conditional UPDATE and a lease, so no external broker is needed.
+# Handlers are registered with @job_handler('kind') in the module that owns the work.
+
+jobs_bp = Blueprint('jobs', __name__)
+
+_handlers = {}
+
+# Handlers living in modules too heavy to import at startup (pandas, ...): the module is
+# imported the first time a job of that kind is queued inline or run by a worker.
+_handler_modules = {
+    'analytics_report': 'analytics',
+}
+
+
+def job_handler(kind):
+    """Register fn(job) as the handler for jobs of this kind. Its return value is stored as job.result."""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def _get_handler(kind):
+    if kind not in _handlers and kind in _handler_modules:
+        importlib.import_module(_handler_modules[kind])
+    return _handlers.get(kind)
+
+
+def _utcnow():
+    # Naive UTC, matching how the DateTime columns are stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(kind, payload=None, owner_id=None, max_attempts=3):
+    """
+    Queue a job in the caller's transaction: it is only flushed, and workers see it once the
+    caller commits (a rollback drops it with everything else). With JOBS_RUN_INLINE set (handy
+    in development without a worker) the job runs at the end of the request that committed it.
+    """
+    if kind not in _handlers and kind not in _handler_modules:
+        raise ValueError(f'No job handler registered for {kind!r}')
+    job = Job(kind=kind, payload=payload or {}, owner_id=owner_id, max_attempts=max_attempts, run_after=_utcnow())
+    db.session.add(job)
+    db.session.flush() # Assigns job.id
+
+    if current_app.config.get('JOBS_RUN_INLINE'):
+        db.session.info.setdefault(_INLINE_PENDING_KEY, []).append(job.id)
+    return job
+
+
+# Inline jobs wait for the commit that makes them real, then run once the view has returned
+_INLINE_PENDING_KEY = 'jobs_inline_pending'
+_INLINE_READY_KEY = 'jobs_inline_ready'
+
+
+def _after_commit(session):
+    committed = session.info.pop(_INLINE_PENDING_KEY, None)
+    if committed:
+        session.info.setdefault(_INLINE_READY_KEY, []).extend(committed)
+
+
+def _after_rollback(session):
+    session.info.pop(_INLINE_PENDING_KEY, None)
+
+
+sa_event.listen(db.session, 'after_commit', _after_commit)
+sa_event.listen(db.session, 'after_rollback', _after_rollback)
+
+
+@jobs_bp.after_app_request
+def _run_inline_jobs(response):
+    for job_id in db.session.info.pop(_INLINE_READY_KEY, []):
+        claimed = _claim(job_id, _utcnow())
+        if claimed:
+            run_job(claimed)
+    return response
+
+
+def result_dir(job):
+    """Directory where a job can leave files for the result endpoint."""
+    path = os.path.join(current_app.instance_path, 'job_results', str(job.id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def report_progress(job, percent):
+    """
+    Record progress and extend the job's lease. Written on a separate connection so it is
+    visible while the handler keeps working; best effort, since SQLite may be busy.
+    """
+    if has_request_context():
+        return # Running inline inside a request: nobody can poll it, and the request may hold the write lock
+    lease = current_app.config.get('JOB_LEASE_SECONDS', 600)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job).where(Job.id == job.id)
+                .values(progress=max(0, min(int(percent), 99)), locked_until=_utcnow() + timedelta(seconds=lease))
+            )
+    except OperationalError:
+        pass
+
+
+def _claimable(now):
+    return or_(
+        and_(Job.status == JobStatus.QUEUED, Job.run_after <= now),
+        and_(Job.status == JobStatus.RUNNING, Job.locked_until < now), # Abandoned by a dead worker
+    )
+
+
+def _claim(job_id, now):
+    lease = current_app.config.get('JOB_LEASE_SECONDS', 600)
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, _claimable(now))
+        .values(status=JobStatus.RUNNING, attempts=Job.attempts + 1, locked_until=now + timedelta(seconds=lease))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return db.session.get(Job, job_id) if claimed else None
+
+
+def claim_next_job():
+    """Claim the oldest runnable job, or return None. Safe to call from many processes at once."""
+    now = _utcnow()
+    while True:
+        candidate = db.session.query(Job.id).filter(_claimable(now)).order_by(Job.run_after.asc(), Job.id.asc()).first()
+        if candidate is None:
+            return None
+        job = _claim(candidate.id, now)
+        if job is not None:
+            return job
+        # Another worker won the race for this one; look again
+
+
+def run_job(job):
+    """Run a claimed job's handler and record success, a retry, or the final failure."""
+    handler = _get_handler(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No job handler registered for {job.kind!r}')
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Job exceeded its attempts (worker died while running it)')
+        result = handler(job)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        if job.attempts < job.max_attempts and handler is not None:
+            # Exponential backoff before the next attempt
+            backoff = current_app.config.get('JOB_RETRY_BACKOFF_SECONDS', 10) * 2 ** (job.attempts - 1)
+            job.status = JobStatus.QUEUED
+            job.run_after = _utcnow() + timedelta(seconds=backoff)
+        else:
+            job.status = JobStatus.FAILED
+            job.finished_at = _utcnow()
+        current_app.logger.error('Job %s (%s) attempt %s failed: %s', job.id, job.kind, job.attempts, job.error)
+    else:
+        job.status = JobStatus.SUCCEEDED
+        job.progress = 100
+        job.result = result
+        job.error = None
+        job.finished_at = _utcnow()
+    job.locked_until = None
+    db.session.commit()
+    return job
+
+
+def work(app, burst=False, poll_interval=1.0):
+    """Worker loop: claim and run jobs until stopped (or, with burst=True, until the queue is empty)."""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+    with app.app_context():
+        db.engine.dispose(close=False) # Never share pooled connections inherited across fork()
+        while not stopping:
+            try:
+                job = claim_next_job()
+            except OperationalError:
+                db.session.rollback() # Database busy; try again shortly
+                job = None
+            if job is None:
+                if burst:
+                    return
+                time.sleep(poll_interval)
+                continue
+            run_job(job)
+            db.session.remove()
+
+
+def run_worker_pool(app, processes=2, burst=False, poll_interval=1.0):
+    """Fork `processes` workers that share the queue, and wait for them to exit."""
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=work, args=(app, burst, poll_interval), name=f'job-worker-{i}')
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def purge_finished_jobs(older_than_days=7):
+    """Delete finished jobs (and their result files) older than the given age. Returns how many were removed."""
+    cutoff = _utcnow() - timedelta(days=older_than_days)
+    old_jobs = Job.query.filter(Job.status.in_([JobStatus.SUCCEEDED, JobStatus.FAILED]), Job.finished_at < cutoff).all()
+    for job in old_jobs:
+        shutil.rmtree(os.path.join(current_app.instance_path, 'job_results', str(job.id)), ignore_errors=True)
+        db.session.delete(job)
+    db.session.commit()
+    return len(old_jobs)
+
+
+# --- Status and result endpoints ---
+
+def _get_visible_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job or (job.owner_id != current_user.id and current_user.role != Role.ADMIN):
+        abort(404)
+    return job
+
+
+def wants_json():
+    return request.args.get('format') == 'json' or \
+        request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+
+
+def job_accepted_response(job):
+    """What a request that just queued a job returns: 202 + job id for API clients, the status page for browsers."""
+    if wants_json():
+        return jsonify(job_id=job.id, status_url=url_for('jobs.job_status', job_id=job.id)), 202
+    return render_template('jobs/job_status.html', title='Job Status', job=job, job_data=job.to_dict()), 202
+
+
+@jobs_bp.route('/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = _get_visible_job(job_id)
+    data = job.to_dict()
+    if job.status == JobStatus.SUCCEEDED and job.result and job.result.get('file'):
+        data['result_url'] = url_for('jobs.job_result', job_id=job.id)
+    if wants_json():
+        return jsonify(data)
+    return render_template('jobs/job_status.html', title='Job Status', job=job, job_data=data)
+
+
+@jobs_bp.route('/<int:job_id>/result')
+@login_required
+def job_result(job_id):
+    job = _get_visible_job(job_id)
+    if job.status != JobStatus.SUCCEEDED or not job.result or not job.result.get('file'):
+        abort(404)
+    path = os.path.join(current_app.instance_path, 'job_results', str(job.id), job.result['file'])
+    if not os.path.exists(path):
+        abort(410) # Purged
+    return send_file(path, as_attachment=True, download_name=job.result.get('download_name', job.result['file']),
+                     mimetype=job.result.get('mimetype'))
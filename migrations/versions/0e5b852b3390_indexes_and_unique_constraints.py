@@ -0,0 +1,75 @@
+"""Indexes for the hot query paths; unique ratings and follows
+
+Revision ID: 0e5b852b3390
+Revises: b79f6581a911
+Create Date: 2026-10-16 21:12:03.551840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e5b852b3390'
+down_revision = 'b79f6581a911'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_category_start', ['category_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_event_organizer_start', ['organizer_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_event_start_time', ['start_time'], unique=False)
+
+    # Drop duplicate follows (the table has no primary key, so rebuild it from the distinct pairs)
+    bind = op.get_bind()
+    pairs = bind.execute(sa.text(
+        "SELECT DISTINCT follower_id, followed_id FROM followers"
+    )).fetchall()
+    op.execute("DELETE FROM followers")
+    if pairs:
+        bind.execute(sa.text("INSERT INTO followers (follower_id, followed_id) VALUES (:follower_id, :followed_id)"),
+                     [{'follower_id': follower_id, 'followed_id': followed_id} for follower_id, followed_id in pairs])
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.create_index('ix_followers_followed', ['followed_id', 'follower_id'], unique=False)
+        batch_op.create_unique_constraint('uq_followers_pair', ['follower_id', 'followed_id'])
+
+    # Keep each user's latest rating of an event, then rebuild the rating aggregates
+    op.execute(
+        "DELETE FROM rating WHERE id NOT IN "
+        "(SELECT MAX(id) FROM rating GROUP BY user_id, event_id)"
+    )
+    op.execute(
+        "UPDATE event SET "
+        "rating_count = (SELECT COUNT(rating.id) FROM rating WHERE rating.event_id = event.id), "
+        "rating_sum = (SELECT COALESCE(SUM(rating.rating), 0) FROM rating WHERE rating.event_id = event.id)"
+    )
+    with op.batch_alter_table('rating', schema=None) as batch_op:
+        batch_op.create_index('ix_rating_event_time', ['event_id', 'timestamp'], unique=False)
+        batch_op.create_unique_constraint('uq_rating_user_event', ['user_id', 'event_id'])
+
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.create_index('ix_registration_date', ['registration_date'], unique=False)
+        batch_op.create_index('ix_registration_event_status_date', ['event_id', 'status', 'registration_date'], unique=False)
+        batch_op.create_index('ix_registration_user_date', ['user_id', 'registration_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.drop_index('ix_registration_user_date')
+        batch_op.drop_index('ix_registration_event_status_date')
+        batch_op.drop_index('ix_registration_date')
+
+    with op.batch_alter_table('rating', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_rating_user_event', type_='unique')
+        batch_op.drop_index('ix_rating_event_time')
+
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_followers_pair', type_='unique')
+        batch_op.drop_index('ix_followers_followed')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_start_time')
+        batch_op.drop_index('ix_event_organizer_start')
+        batch_op.drop_index('ix_event_category_start')
@@ -0,0 +1,26 @@
+"""Event.updated_at for calendar feed validators
+
+Revision ID: 5c2d9e7a41f0
+Revises: 0e5b852b3390
+Create Date: 2026-10-16 23:58:21.310462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2d9e7a41f0'
+down_revision = '0e5b852b3390'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,55 @@
+"""Following feed table
+
+Revision ID: 7b3e5f0c9d12
+Revises: f2a8c6e13b57
+Create Date: 2026-10-17 12:20:51.384210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e5f0c9d12'
+down_revision = 'f2a8c6e13b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('feed_item',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('organizer_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'event_id')
+    )
+    with op.batch_alter_table('feed_item', schema=None) as batch_op:
+        batch_op.create_index('ix_feed_item_event', ['event_id'], unique=False)
+        batch_op.create_index('ix_feed_item_user_start', ['user_id', 'start_time', 'event_id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feed_fanout_on_read', sa.Boolean(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_user_feed_fanout_on_read'), ['feed_fanout_on_read'], unique=False)
+
+    # Backfill upcoming events (`flask feed rebuild` also moves big organizers to fan-out on read)
+    op.execute(
+        "INSERT INTO feed_item (user_id, event_id, organizer_id, start_time) "
+        "SELECT followers.follower_id, event.id, event.organizer_id, event.start_time "
+        "FROM followers JOIN event ON event.organizer_id = followers.followed_id "
+        "WHERE event.start_time >= CURRENT_TIMESTAMP"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_feed_fanout_on_read'))
+        batch_op.drop_column('feed_fanout_on_read')
+
+    with op.batch_alter_table('feed_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_feed_item_user_start')
+        batch_op.drop_index('ix_feed_item_event')
+
+    op.drop_table('feed_item')
@@ -0,0 +1,29 @@
+"""Statistics rollup table
+
+Revision ID: 8a3f61d27c4e
+Revises: 5c2d9e7a41f0
+Create Date: 2026-10-17 00:41:09.118274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3f61d27c4e'
+down_revision = '5c2d9e7a41f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stats_rollup',
+    sa.Column('metric', sa.String(length=40), nullable=False),
+    sa.Column('bucket', sa.String(length=40), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'bucket')
+    )
+
+
+def downgrade():
+    op.drop_table('stats_rollup')
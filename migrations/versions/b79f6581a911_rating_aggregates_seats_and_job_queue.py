@@ -0,0 +1,95 @@
+"""Rating aggregates, seats_taken, waitlist status, job queue, notification indexes
+
+Revision ID: b79f6581a911
+Revises: b06cac62b834
+Create Date: 2026-10-16 21:07:40.902716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b79f6581a911'
+down_revision = 'b06cac62b834'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app's create_all() may already have created the job table on an existing database
+    if 'job' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='jobstatus'), nullable=False),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('job', schema=None) as batch_op:
+            batch_op.create_index('ix_job_status_run_after', ['status', 'run_after'], unique=False)
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('seats_taken', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_read_time', ['user_id', 'is_read', 'timestamp'], unique=False)
+        batch_op.create_index('ix_notification_user_time', ['user_id', 'timestamp'], unique=False)
+
+    # Keep the earliest registration of each user for each event before adding the unique constraint
+    op.execute(
+        "DELETE FROM registration WHERE id NOT IN "
+        "(SELECT MIN(id) FROM registration GROUP BY user_id, event_id)"
+    )
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.alter_column('status',
+               existing_type=sa.VARCHAR(length=9),
+               type_=sa.Enum('PENDING', 'APPROVED', 'CANCELLED', 'WAITLISTED', name='registrationstatus'),
+               existing_nullable=False)
+        batch_op.create_unique_constraint('uq_registration_user_event', ['user_id', 'event_id'])
+
+    # Backfill the new counters (same as `flask repair-ratings` / `flask repair-registrations`)
+    op.execute(
+        "UPDATE event SET "
+        "rating_count = (SELECT COUNT(rating.id) FROM rating WHERE rating.event_id = event.id), "
+        "rating_sum = (SELECT COALESCE(SUM(rating.rating), 0) FROM rating WHERE rating.event_id = event.id), "
+        "seats_taken = (SELECT COUNT(registration.id) FROM registration "
+        "WHERE registration.event_id = event.id AND registration.status IN ('PENDING', 'APPROVED'))"
+    )
+
+
+def downgrade():
+    op.execute("UPDATE registration SET status = 'CANCELLED' WHERE status = 'WAITLISTED'")
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_registration_user_event', type_='unique')
+        batch_op.alter_column('status',
+               existing_type=sa.Enum('PENDING', 'APPROVED', 'CANCELLED', 'WAITLISTED', name='registrationstatus'),
+               type_=sa.Enum('PENDING', 'APPROVED', 'CANCELLED', name='registrationstatus'),
+               existing_nullable=False)
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_user_time')
+        batch_op.drop_index('ix_notification_user_read_time')
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('seats_taken')
+
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_status_run_after')
+
+    op.drop_table('job')
@@ -0,0 +1,26 @@
+"""Registration status/date index for the admin registration list
+
+Revision ID: d41c7b9e2a63
+Revises: 8a3f61d27c4e
+Create Date: 2026-10-17 10:12:44.502816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7b9e2a63'
+down_revision = '8a3f61d27c4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.create_index('ix_registration_status_date', ['status', 'registration_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('registration', schema=None) as batch_op:
+        batch_op.drop_index('ix_registration_status_date')
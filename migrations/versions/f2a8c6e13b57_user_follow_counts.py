@@ -0,0 +1,35 @@
+"""User follower/following counts
+
+Revision ID: f2a8c6e13b57
+Revises: d41c7b9e2a63
+Create Date: 2026-10-17 11:03:27.730941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c6e13b57'
+down_revision = 'd41c7b9e2a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill (same as `flask repair-follows`)
+    op.execute(
+        'UPDATE "user" SET '
+        'follower_count = (SELECT COUNT(*) FROM followers WHERE followers.followed_id = "user".id), '
+        'following_count = (SELECT COUNT(*) FROM followers WHERE followers.follower_id = "user".id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('follower_count')
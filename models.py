@@ -4,12 +4,14 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from enum import Enum
 import datetime
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
-from sqlalchemy import func # Import func for aggregate functions
+from sqlalchemy import func, case, select, update # Import func for aggregate functions
 
 # Association table for followers
 followers = db.Table('followers', db.metadata,
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id')),
+    db.UniqueConstraint('follower_id', 'followed_id', name='uq_followers_pair'), # Also serves "who do I follow" / is_following
+    db.Index('ix_followers_followed', 'followed_id', 'follower_id') # "Who follows me"
 )
 
 # Enums for roles and registration status
@@ -22,6 +24,16 @@ class RegistrationStatus(Enum):
     PENDING = 'pending'
     APPROVED = 'approved'
     CANCELLED = 'cancelled'
+    WAITLISTED = 'waitlisted'
+
+class JobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+# Statuses that occupy one of an event's max_attendees seats
+SEAT_HOLDING_STATUSES = (RegistrationStatus.PENDING, RegistrationStatus.APPROVED)
 
 # User Model
 class User(UserMixin, db.Model):
@@ -31,6 +43,12 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.Enum(Role), default=Role.STUDENT, nullable=False)
     profile_picture = db.Column(db.String(50), nullable=False, default='default.jpg') # Increased length for full path
+
+    # Denormalized sizes of the follow graph, maintained by follow_graph.py
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set once an organizer has too many followers to fan their events out (see feed.py); never cleared
+    feed_fanout_on_read = db.Column(db.Boolean, nullable=False, default=False, server_default='0', index=True)
     
     # Relationships
     events = db.relationship('Event', backref='organizer', lazy=True)
@@ -53,23 +71,31 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def follow(self, user):
-        if not self.is_following(user):
-            self.followed.append(user)
-            return True
-        return False
+        import follow_graph
+        return follow_graph.follow(self.id, user.id)
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.followed.remove(user)
-            return True
-        return False
+        import follow_graph
+        return follow_graph.unfollow(self.id, user.id)
 
     def is_following(self, user):
         # Ensure 'user' is a User object before accessing its ID
         if isinstance(user, User):
-            return self.followed.filter(followers.c.followed_id == user.id).count() > 0
+            import follow_graph # Cached followed-id set instead of a COUNT per call
+            return follow_graph.is_following(self.id, user.id)
         return False
 
+    @staticmethod
+    def recompute_follow_counts():
+        """Rebuild follower_count/following_count for every user from the followers table. Returns the number of rows touched."""
+        result = db.session.execute(
+            update(User).execution_options(synchronize_session=False).values(
+                follower_count=select(func.count()).where(followers.c.followed_id == User.id).scalar_subquery(),
+                following_count=select(func.count()).where(followers.c.follower_id == User.id).scalar_subquery()
+            )
+        )
+        return result.rowcount
+
 # Flask-Login user loader function
 @login_manager.user_loader
 def load_user(user_id):
@@ -77,6 +103,12 @@ def load_user(user_id):
 
 # Event Model
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_start_time', 'start_time'), # Dashboard order and calendar range scans
+        db.Index('ix_event_organizer_start', 'organizer_id', 'start_time'), # Organizer dashboard
+        db.Index('ix_event_category_start', 'category_id', 'start_time'), # Dashboard filtered by category
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -88,23 +120,82 @@ class Event(db.Model):
     organizer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     
+    # Last change to the event's details (not its counters); drives the calendar feeds' ETag/Last-Modified
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None),
+                           server_default=db.func.current_timestamp())
+
+    # Registrations currently holding a seat (pending or approved), maintained by registrations.py
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     registrations = db.relationship('Registration', backref='event', lazy='dynamic', cascade="all, delete-orphan")
     ratings = db.relationship('Rating', backref='event', lazy='dynamic', cascade="all, delete-orphan")
 
-    # Hybrid property for average_rating calculation
+    # Denormalized rating aggregates, kept in step with the Rating table by record_rating()
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Hybrid property for average_rating calculation (O(1), no Rating rows loaded)
     @hybrid_property
     def average_rating(self):
-        if self.ratings.count() == 0:
+        if not self.rating_count:
             return 0.0
-        return sum(rating.rating for rating in self.ratings.all()) / self.ratings.count()
+        return self.rating_sum / self.rating_count
 
     @average_rating.expression
     def average_rating(cls):
-        return db.session.query(func.avg(Rating.rating)).filter(Rating.event_id == cls.id).label("average_rating")
+        # Plain column arithmetic, so it can be used in ORDER BY for "top rated" listings
+        return case((cls.rating_count > 0, cls.rating_sum * 1.0 / cls.rating_count), else_=0.0).label("average_rating")
+
+    def record_rating(self, new_value, old_value=None):
+        """
+        Fold a new rating (or a changed one, when old_value is given) into the aggregates.
+        Uses SQL-side increments so concurrent raters can't overwrite each other's update;
+        call it in the same transaction as the Rating insert/update.
+        """
+        if old_value is None:
+            self.rating_count = Event.rating_count + 1
+            self.rating_sum = Event.rating_sum + new_value
+        else:
+            self.rating_sum = Event.rating_sum + (new_value - old_value)
+
+    @staticmethod
+    def recompute_rating_aggregates():
+        """Rebuild rating_count/rating_sum for every event from the Rating table. Returns the number of rows touched."""
+        result = db.session.execute(
+            update(Event).values(
+                rating_count=select(func.count(Rating.id)).where(Rating.event_id == Event.id).scalar_subquery(),
+                rating_sum=select(func.coalesce(func.sum(Rating.rating), 0)).where(Rating.event_id == Event.id).scalar_subquery()
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    def recompute_seats_taken(event_ids=None):
+        """Rebuild seats_taken for every event (or only event_ids) from the Registration table. Returns the number of rows touched."""
+        statement = update(Event)
+        if event_ids is not None:
+            statement = statement.where(Event.id.in_(event_ids))
+        result = db.session.execute(
+            statement.execution_options(synchronize_session=False).values(
+                seats_taken=select(func.count(Registration.id)).where(
+                    Registration.event_id == Event.id,
+                    Registration.status.in_(SEAT_HOLDING_STATUSES)
+                ).scalar_subquery()
+            )
+        )
+        return result.rowcount
 
 # Registration Model
 class Registration(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='uq_registration_user_event'), # Also serves lookups by user
+        db.Index('ix_registration_event_status_date', 'event_id', 'status', 'registration_date'), # Seats, waitlist, check-in, exports
+        db.Index('ix_registration_user_date', 'user_id', 'registration_date'), # My registrations, newest first
+        db.Index('ix_registration_date', 'registration_date'), # Admin registration list
+        db.Index('ix_registration_status_date', 'status', 'registration_date'), # Admin list filtered by status, per-status counts
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
@@ -119,6 +210,11 @@ class Category(db.Model):
 
 # Rating Model
 class Rating(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='uq_rating_user_event'), # One rating per user per event
+        db.Index('ix_rating_event_time', 'event_id', 'timestamp'), # An event's ratings, newest first
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text, nullable=True)
@@ -128,8 +224,64 @@ class Rating(db.Model):
 
 # Notification Model
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_read_time', 'user_id', 'is_read', 'timestamp'), # Unread badge count
+        db.Index('ix_notification_user_time', 'user_id', 'timestamp'), # Inbox pages, newest first
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(255), nullable=False)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
\ No newline at end of file
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+# Background Job Model (queue table used by jobs.py)
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'), # The worker's "next job" lookup
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    progress = db.Column(db.Integer, default=0, nullable=False) # Percent complete
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    run_after = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True) # Lease; an expired lease means the worker died
+    created_at = db.Column(db.DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status.value,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'error': self.error if self.status == JobStatus.FAILED else None,
+            'result': self.result,
+        }
+
+# "Events from people I follow" rows, written by feed.py when an event is created (fan-out on write).
+# start_time is copied from the event so a feed page is one index range.
+class FeedItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_feed_item_user_start', 'user_id', 'start_time', 'event_id'), # A user's feed, soonest first
+        db.Index('ix_feed_item_event', 'event_id'), # Edited/deleted events
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    organizer_id = db.Column(db.Integer, nullable=False) # For unfollows
+    start_time = db.Column(db.DateTime, nullable=False)
+
+# Precomputed site statistics (rebuilt by stats.refresh_rollups), so pages read a few rows instead of counting tables
+class StatsRollup(db.Model):
+    metric = db.Column(db.String(40), primary_key=True) # 'total', 'registrations_by_day', 'events_by_category', ...
+    bucket = db.Column(db.String(40), primary_key=True) # Counter name, day (YYYY-MM-DD), category id or event id
+    value = db.Column(db.Integer, nullable=False, default=0)
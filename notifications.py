@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import select, insert, literal, update, func
+
+from extensions import db
+from models import User, Notification, Role, followers
+from jobs import job_handler
+from cache import TTLCache, delete_on_commit
+
+# Per-process cache for the unread badge. Marking notifications read clears the reader's entry;
+# notifications created elsewhere (other workers, background jobs) show up within the TTL.
+_unread_counts = TTLCache(maxsize=10000, ttl=30)
+
+
+def _unread_cache():
+    return _unread_counts
+
+
+def broadcast(message, role=None, followers_of=None):
+    """
+    Send an in-app notification to every matching user with one INSERT ... SELECT,
+    so the cost doesn't depend on loading User rows into Python.
+    role limits it to one Role; followers_of (a user id) to that organizer's followers.
+    Returns the number of notifications created. The caller commits.
+    """
+    recipients = select(
+        User.id,
+        literal(message, db.String),
+        literal(False),
+        literal(datetime.now(timezone.utc), db.DateTime),
+    )
+    if role is not None:
+        recipients = recipients.where(User.role == role)
+    if followers_of is not None:
+        recipients = recipients.join(followers, followers.c.follower_id == User.id) \
+            .where(followers.c.followed_id == followers_of)
+
+    result = db.session.execute(
+        insert(Notification).from_select(['user_id', 'message', 'is_read', 'timestamp'], recipients)
+    )
+    return result.rowcount
+
+
+def unread_count(user_id):
+    """Number of unread notifications for a user (a covered index count), cached briefly."""
+    ttl = current_app.config.get('NOTIFICATION_COUNT_TTL', 30)
+    return _unread_counts.get_or_set(
+        user_id,
+        lambda: db.session.query(func.count(Notification.id)).filter(
+            Notification.user_id == user_id, Notification.is_read == False
+        ).scalar(),
+        ttl=ttl
+    )
+
+
+def mark_read(user_id, notification_ids):
+    """Mark the given notifications of one user as read with a single UPDATE. The caller commits."""
+    if not notification_ids:
+        return 0
+    result = db.session.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.id.in_(notification_ids), Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    delete_on_commit(_unread_cache, user_id) # A badge poll before the commit would re-cache the old count
+    return result.rowcount
+
+
+@job_handler('broadcast_notification')
+def broadcast_notification_job(job):
+    role = Role(job.payload['role']) if job.payload.get('role') else None
+    sent = broadcast(job.payload['message'], role=role, followers_of=job.payload.get('followers_of'))
+    db.session.commit()
+    return {'sent': sent}
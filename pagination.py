@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_, func, select
+
+from extensions import db
+
+
+class KeysetPagination:
+    """
+    One page of a keyset (cursor) paginated query.
+    Mirrors the parts of Flask-SQLAlchemy's Pagination that still make sense without
+    page numbers: items, per_page, total, has_next/has_prev, plus opaque next/prev cursors.
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total # Estimated, or None when no cheap estimate exists
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'value'): # Enum members
+        return value.value
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, list(values)], default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """
+    Returns (direction, values) for a token produced by encode_cursor, with values converted
+    back to the columns' Python types. Malformed or foreign tokens give (None, None),
+    which callers treat as "first page".
+    """
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            return None, None
+        converted = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            elif value is not None and hasattr(column.type, 'enum_class') and column.type.enum_class:
+                value = column.type.enum_class(value)
+            converted.append(value)
+        return direction, converted
+    except (ValueError, TypeError, binascii.Error, NotImplementedError):
+        return None, None
+
+
+def _after(columns, values, descending):
+    """
+    WHERE clause for rows strictly after `values` in (columns) order, written as
+    c1 >= v1 AND (c1 > v1 OR (c1 = v1 AND c2 > v2) ...) so the leading column is an index range.
+    """
+    def beyond(column, value):
+        return column < value if descending else column > value
+
+    alternatives = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        alternatives.append(and_(*equal_prefix, beyond(column, value)))
+
+    leading = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(leading, or_(*alternatives))
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, descending=False, total=None):
+    """
+    Paginate `query` (an ORM query over a single entity) by the unique key `columns`,
+    e.g. (Event.start_time, Event.id). Each page is one indexed range scan of per_page + 1
+    rows, so page 5,000 costs the same as page 1 and no COUNT(*) is issued.
+    """
+    direction, values = decode_cursor(cursor, columns)
+    backwards = direction == 'prev'
+
+    if values is not None:
+        query = query.filter(_after(columns, values, descending != backwards))
+
+    scan_descending = descending != backwards
+    query = query.order_by(None).order_by(*[c.desc() if scan_descending else c.asc() for c in columns])
+    rows = query.limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key_of(item):
+        return [getattr(item, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        more_after = has_more if not backwards else True
+        more_before = has_more if backwards else values is not None
+        if more_after:
+            next_cursor = encode_cursor('next', key_of(rows[-1]))
+        if more_before:
+            prev_cursor = encode_cursor('prev', key_of(rows[0]))
+
+    return KeysetPagination(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total)
+
+
+def estimate_row_count(model):
+    """
+    Cheap row-count estimate for a whole table: the span of its integer primary key,
+    answered from the two ends of the primary key index instead of a COUNT(*) scan.
+    Overestimates by the number of deleted rows.
+    """
+    # Two scalar subqueries: SQLite only uses the min/max index shortcut for a lone min() or max()
+    low, high = db.session.query(
+        select(func.min(model.id)).scalar_subquery(),
+        select(func.max(model.id)).scalar_subquery()
+    ).one()
+    if low is None:
+        return 0
+    return high - low + 1
@@ -0,0 +1,207 @@
+from datetime import datetime, timezone
+from sqlalchemy import update, insert, select, literal, or_, func
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Event, Registration, Notification, RegistrationStatus, SEAT_HOLDING_STATUSES
+from event_cache import invalidate_event
+
+# Capacity is enforced with a conditional UPDATE on Event.seats_taken: the row only changes
+# while a seat is free, so the database decides who gets the last seat, not a Python check.
+# Everything here runs in the caller's transaction; register_user() is the only one that commits.
+
+
+def claim_seat(event_id):
+    """Take one seat if the event has room. Returns True when a seat was taken."""
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id,
+               or_(Event.max_attendees.is_(None), Event.seats_taken < Event.max_attendees))
+        .values(seats_taken=Event.seats_taken + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        invalidate_event(event_id)
+    return result.rowcount == 1
+
+
+def force_seat(event_id):
+    """Take a seat regardless of capacity (organizer/admin approval overrides the limit)."""
+    db.session.execute(
+        update(Event).where(Event.id == event_id)
+        .values(seats_taken=Event.seats_taken + 1)
+        .execution_options(synchronize_session=False)
+    )
+    invalidate_event(event_id)
+
+
+def free_seat(event_id):
+    db.session.execute(
+        update(Event).where(Event.id == event_id, Event.seats_taken > 0)
+        .values(seats_taken=Event.seats_taken - 1)
+        .execution_options(synchronize_session=False)
+    )
+    invalidate_event(event_id)
+
+
+def register_user(event, user_id):
+    """
+    Register user_id for event in a single transaction: claim a seat if one is free,
+    otherwise join the waitlist. A previously cancelled registration is reactivated
+    (at the back of the queue). Returns the Registration, or None if the user already
+    holds an active registration (the unique (user_id, event_id) constraint is the final guard).
+    """
+    registration = Registration.query.filter_by(user_id=user_id, event_id=event.id).first()
+    if registration and registration.status != RegistrationStatus.CANCELLED:
+        return None
+
+    status = RegistrationStatus.PENDING if claim_seat(event.id) else RegistrationStatus.WAITLISTED
+    if registration:
+        # Conditional, so two concurrent re-registrations can't both reactivate the row
+        reactivated = db.session.execute(
+            update(Registration)
+            .where(Registration.id == registration.id, Registration.status == RegistrationStatus.CANCELLED)
+            .values(status=status, registration_date=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not reactivated:
+            db.session.rollback()
+            return None
+    else:
+        registration = Registration(user_id=user_id, event_id=event.id, status=status)
+        db.session.add(registration)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback() # Also undoes the seat claimed above
+        return None
+    return registration
+
+
+def release_seat(event_id):
+    """
+    Give back a seat after a seat-holding registration was deleted or cancelled,
+    then hand it to the waitlist. Returns the promoted registrations.
+    """
+    free_seat(event_id)
+    return promote_waitlist(event_id)
+
+
+def promote_waitlist(event_id):
+    """
+    Move waitlisted registrations into free seats, first come first served, and notify them.
+    Also call this after max_attendees is raised. Returns the promoted registrations.
+    """
+    promoted = []
+    while True:
+        next_in_line = Registration.query.filter_by(event_id=event_id, status=RegistrationStatus.WAITLISTED) \
+            .order_by(Registration.registration_date.asc(), Registration.id.asc()).first()
+        if not next_in_line or not claim_seat(event_id):
+            break
+
+        moved = db.session.execute(
+            update(Registration)
+            .where(Registration.id == next_in_line.id, Registration.status == RegistrationStatus.WAITLISTED)
+            .values(status=RegistrationStatus.PENDING)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not moved: # Someone else promoted or removed them first; give the seat back and retry
+            free_seat(event_id)
+            continue
+
+        db.session.expire(next_in_line, ['status'])
+        db.session.add(Notification(
+            user_id=next_in_line.user_id,
+            message=f'A seat opened up for "{next_in_line.event.title}" and you have been moved off the waitlist!'
+        ))
+        promoted.append(next_in_line)
+    return promoted
+
+
+def set_status(registration, new_status):
+    """
+    Change a registration's status and keep Event.seats_taken in step: moving into a
+    seat-holding status takes a seat (even past capacity, for organizer/admin overrides),
+    moving out of one releases it to the waitlist.
+    """
+    was_holding = registration.status in SEAT_HOLDING_STATUSES
+    will_hold = new_status in SEAT_HOLDING_STATUSES
+    registration.status = new_status
+
+    if will_hold and not was_holding:
+        force_seat(registration.event_id)
+    elif was_holding and not will_hold:
+        db.session.flush() # Remove this registration from the waitlist query before promoting
+        release_seat(registration.event_id)
+
+
+def _notify_registrations(registration_filter, before_title, after_title):
+    """One INSERT ... SELECT notifying each matching registration's user: before_title + event title + after_title."""
+    db.session.execute(
+        insert(Notification).from_select(
+            ['user_id', 'message', 'is_read', 'timestamp'],
+            select(
+                Registration.user_id,
+                literal(before_title, db.String) + Event.title + literal(after_title, db.String),
+                literal(False),
+                literal(datetime.now(timezone.utc), db.DateTime),
+            ).join(Event, Event.id == Registration.event_id).where(*registration_filter)
+        )
+    )
+
+
+def promote_waitlists(event_ids):
+    """
+    promote_waitlist() for many events at once: the first N waitlisted registrations of each event
+    (N = its free seats, by registration date) move to pending with one UPDATE, after one
+    INSERT ... SELECT for their notifications. Returns the number promoted. The caller commits.
+    """
+    queue = select(
+        Registration.id, Registration.event_id,
+        func.row_number().over(partition_by=Registration.event_id,
+                               order_by=(Registration.registration_date, Registration.id)).label('place'),
+    ).where(Registration.event_id.in_(event_ids), Registration.status == RegistrationStatus.WAITLISTED).subquery()
+    promoted_ids = select(queue.c.id).join(Event, Event.id == queue.c.event_id).where(
+        or_(Event.max_attendees.is_(None), queue.c.place <= Event.max_attendees - Event.seats_taken))
+    promoting = (Registration.id.in_(promoted_ids), Registration.status == RegistrationStatus.WAITLISTED)
+
+    # Same order as bulk_set_status(): the notifications first, while the rows still match
+    _notify_registrations(promoting, 'A seat opened up for "', '" and you have been moved off the waitlist!')
+    promoted = db.session.execute(
+        update(Registration).where(*promoting).values(status=RegistrationStatus.PENDING)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if promoted:
+        Event.recompute_seats_taken(event_ids)
+    return promoted
+
+
+def bulk_set_status(criteria, new_status, message, from_statuses):
+    """
+    set_status() for every registration matching `criteria` (Registration column filters) whose
+    status is one of from_statuses, in the caller's transaction: one INSERT ... SELECT for the
+    notifications ('Your registration for "<title>" <message>'), one UPDATE for the statuses,
+    then seats_taken is rebuilt for the events touched and freed seats go to their waitlists
+    (promote_waitlists()). Returns the number of registrations changed. The caller commits.
+    """
+    changing = (*criteria, Registration.status.in_([status for status in from_statuses if status != new_status]))
+    event_ids = list(db.session.scalars(select(Registration.event_id).where(*changing).distinct()))
+    if not event_ids:
+        return 0
+
+    # Written before the UPDATE, while the rows still match; on SQLite this insert also takes the
+    # write lock, so nothing can change the selection between here and the UPDATE
+    _notify_registrations(changing, 'Your registration for "', f'" {message}')
+    changed = db.session.execute(
+        update(Registration).where(*changing).values(status=new_status)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Approving waitlisted registrations may overfill an event (admin override), like force_seat()
+    Event.recompute_seats_taken(event_ids)
+    if new_status not in SEAT_HOLDING_STATUSES:
+        promote_waitlists(event_ids)
+    invalidate_event(*event_ids)
+    db.session.expire_all() # Loaded registrations/events are stale after the set-based updates
+    return changed
@@ -0,0 +1,137 @@
+import re
+from sqlalchemy import text, or_, Integer, Float
+
+from extensions import db
+from models import Event
+
+# FTS5 virtual table holding one row per event (rowid == event.id).
+# Category names are copied in so a search for "workshop" finds every workshop.
+SEARCH_TABLE = 'event_search'
+
+# bm25() column weights, in table column order: title, description, location, category
+RANK_WEIGHTS = (10.0, 1.0, 2.0, 4.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_available():
+    """FTS5 is SQLite-only; other databases fall back to LIKE matching."""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def create_search_index():
+    """Create the FTS5 table if it doesn't exist yet and fill it from the event table."""
+    if not search_available():
+        return
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': SEARCH_TABLE}
+        ).first()
+        if exists:
+            return
+        # prefix='2 3' keeps short prefix queries (search-as-you-type) on the index
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            "title, description, location, category, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        _populate(conn)
+
+
+def rebuild_search_index():
+    """Drop and repopulate every row of the search index."""
+    if not search_available():
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        _populate(conn)
+
+
+def _populate(executor, where='', params=None):
+    executor.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, location, category) "
+        "SELECT event.id, event.title, event.description, event.location, coalesce(category.name, '') "
+        "FROM event LEFT JOIN category ON category.id = event.category_id " + where
+    ), params or {})
+
+
+def index_event(event):
+    """
+    (Re)index a single event inside the current session transaction,
+    so the index commits or rolls back together with the event itself.
+    The event must have been flushed so it has an id.
+    """
+    if not search_available():
+        return
+    remove_event(event.id)
+    db.session.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, location, category) "
+        "SELECT :id, :title, :description, :location, name FROM category WHERE id = :category_id"
+    ), {
+        'id': event.id,
+        'title': event.title,
+        'description': event.description,
+        'location': event.location,
+        'category_id': event.category_id,
+    })
+
+
+def remove_event(event_id):
+    if not search_available():
+        return
+    db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {'id': event_id})
+
+
+def reindex_category(category_id):
+    """Refresh the copied category name on every event of a renamed category."""
+    if not search_available():
+        return
+    db.session.flush() # The new name has to be visible to the INSERT ... SELECT below
+    db.session.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM event WHERE category_id = :category_id)"),
+        {'category_id': category_id}
+    )
+    _populate(db.session, 'WHERE event.category_id = :category_id', {'category_id': category_id})
+
+
+def build_match_expression(search_query):
+    """
+    Turn free user input into a safe FTS5 query: every word becomes a quoted
+    prefix term and all terms must match. Returns None if there is nothing to search for.
+    """
+    tokens = _TOKEN_RE.findall(search_query or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def apply_search(events_query, search_query, ranked=True):
+    """
+    Restrict an Event query to events matching search_query.
+    With ranked=True the results are ordered by relevance (best first), then start time;
+    otherwise the caller's ordering is kept.
+    """
+    match_expression = build_match_expression(search_query)
+    if match_expression is None:
+        return events_query
+
+    if not search_available():
+        pattern = f'%{search_query}%'
+        return events_query.filter(or_(
+            Event.title.ilike(pattern),
+            Event.description.ilike(pattern),
+            Event.location.ilike(pattern)
+        ))
+
+    hits = text(
+        f"SELECT rowid AS event_id, bm25({SEARCH_TABLE}, {', '.join(str(w) for w in RANK_WEIGHTS)}) AS rank "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match_expression"
+    ).bindparams(match_expression=match_expression).columns(event_id=Integer, rank=Float).subquery('search_hits')
+
+    events_query = events_query.join(hits, hits.c.event_id == Event.id)
+    if ranked:
+        # bm25() is lower-is-better
+        events_query = events_query.order_by(None).order_by(hits.c.rank.asc(), Event.start_time.asc())
+    return events_query
@@ -0,0 +1,206 @@
+"""
+Synthetic campus dataset for benchmarks and load tests.
+
+Fills a database with users (a few of them organizers), events spread over the past and
+coming semester across the default categories, registrations, ratings, follows and
+notifications. The same --seed always produces the same data. Popular events get most of the
+registrations (a long-tail distribution), capacities are respected (extra registrations are
+waitlisted), past events have check-ins and no-shows, and only attendees of past events rate.
+Rows are bulk-inserted, then the denormalized counters, the search index and the statistics
+rollups are rebuilt.
+
+Usage: python seed_data.py [--users 2000] [--events 300] [--seed 1] [--db path/to/file.db]
+Without --db the data goes into a new temporary SQLite file, whose path is printed.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, func
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from commands import init_db
+from config import Config
+from extensions import db
+from models import User, Event, Registration, Rating, Notification, Category, Role, RegistrationStatus, followers
+
+ADJECTIVES = ['Annual', 'Spring', 'Autumn', 'Intro', 'Advanced', 'Open', 'Late-night', 'Weekend', 'Student', 'Alumni']
+SUBJECTS = ['Robotics', 'Jazz', 'Chess', 'Startup', 'Photography', 'Climate', 'Poetry', 'Football', 'Data Science',
+            'Theatre', 'Cooking', 'Hackathon', 'Film', 'Debate', 'Yoga']
+FORMATS = ['Meetup', 'Workshop', 'Talk', 'Night', 'Tournament', 'Fair', 'Session', 'Showcase']
+LOCATIONS = ['Main Hall', 'Library Room 2', 'Sports Center', 'Auditorium A', 'Student Union', 'Lab 104', 'Courtyard']
+INSERT_CHUNK = 5000 # Rows per bulk INSERT
+
+
+# --- Shared by the bench_*, check_* and stress_* scripts ---
+
+def make_config(db_path, **overrides):
+    """Config class for a throwaway app on the SQLite file db_path; overrides become class attributes."""
+    class SeedConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        TESTING = True
+    for key, value in overrides.items():
+        setattr(SeedConfig, key, value)
+    return SeedConfig
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values, fraction between 0 and 1 (0.0 when there are none)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def check(label, ok, failures):
+    """Print one [ok]/[FAIL] line, collecting the failed labels so the script can exit 1."""
+    print(f"  [{'ok' if ok else 'FAIL'}] {label}")
+    if not ok:
+        failures.append(label)
+
+
+# --- Dataset ---
+
+def _bulk_insert(target, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(insert(target), rows[start:start + INSERT_CHUNK])
+
+
+def generate(users=2000, events=300, registrations_per_user=6, follows_per_user=5, notifications_per_user=8,
+             organizer_share=0.05, rating_share=0.4, seed=1, now=None):
+    """
+    Add a synthetic dataset to the current app's database (inside an app context) and commit it.
+    Returns a dict with the row counts plus a few ids benchmarks need.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None).replace(minute=0, second=0, microsecond=0)
+    admin = User.query.filter_by(email='admin@example.com').first()
+    category_ids = [category_id for (category_id,) in db.session.query(Category.id).order_by(Category.id)]
+
+    # Users: one password hash for everyone ("password"), hashing thousands would take minutes
+    password_hash = generate_password_hash('password')
+    first_user_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    user_rows = [{
+        'id': first_user_id + i, 'username': f'student{first_user_id + i}', 'email': f'student{first_user_id + i}@campus.test',
+        'password_hash': password_hash, 'role': Role.ORGANIZER if rng.random() < organizer_share else Role.STUDENT,
+        'profile_picture': 'default.jpg',
+    } for i in range(users)]
+    _bulk_insert(User, user_rows)
+    user_ids = [row['id'] for row in user_rows]
+    organizer_ids = [admin.id] + [row['id'] for row in user_rows if row['role'] == Role.ORGANIZER]
+
+    # Events: half past, half upcoming, a few running over several days
+    first_event_id = (db.session.query(func.max(Event.id)).scalar() or 0) + 1
+    event_rows = []
+    for i in range(events):
+        start = now + timedelta(days=rng.uniform(-180, 180), hours=rng.randint(8, 20) - now.hour)
+        start = start.replace(minute=0, second=0, microsecond=0)
+        duration = timedelta(days=rng.randint(1, 3)) if rng.random() < 0.05 else timedelta(hours=rng.randint(1, 4))
+        event_rows.append({
+            'id': first_event_id + i,
+            'title': f'{rng.choice(ADJECTIVES)} {rng.choice(SUBJECTS)} {rng.choice(FORMATS)} #{first_event_id + i}',
+            'description': ' '.join(rng.choice(SUBJECTS).lower() for _ in range(rng.randint(20, 80))),
+            'start_time': start, 'end_time': start + duration, 'location': rng.choice(LOCATIONS),
+            'max_attendees': None if rng.random() < 0.3 else rng.choice([20, 30, 50, 100, 200, 500]),
+            'poster': 'default_event_poster.jpg', 'organizer_id': rng.choice(organizer_ids),
+            'category_id': rng.choice(category_ids), 'updated_at': now,
+        })
+    _bulk_insert(Event, event_rows)
+
+    # Registrations: popularity follows a long tail, capacity overflow goes to the waitlist
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(events)]
+    rng.shuffle(weights)
+    seats = {row['id']: 0 for row in event_rows}
+    registration_rows = []
+    rating_rows = []
+    for user_id in user_ids:
+        chosen = {rng.choices(event_rows, weights)[0]['id'] for _ in range(rng.randint(0, 2 * registrations_per_user))}
+        for event in (event_rows[event_id - first_event_id] for event_id in sorted(chosen)):
+            registered_at = event['start_time'] - timedelta(days=rng.uniform(0.5, 30))
+            past = event['end_time'] < now
+            if rng.random() < 0.08:
+                status = RegistrationStatus.CANCELLED
+            elif event['max_attendees'] is not None and seats[event['id']] >= event['max_attendees']:
+                status = RegistrationStatus.WAITLISTED
+            else:
+                seats[event['id']] += 1
+                # Approval happens at check-in: past events have attendees and no-shows
+                status = RegistrationStatus.APPROVED if past and rng.random() < 0.75 else RegistrationStatus.PENDING
+            registration_rows.append({'user_id': user_id, 'event_id': event['id'], 'status': status,
+                                      'registration_date': min(registered_at, now)})
+            if status == RegistrationStatus.APPROVED and rng.random() < rating_share:
+                rating_rows.append({'user_id': user_id, 'event_id': event['id'],
+                                    'rating': rng.choices([1, 2, 3, 4, 5], [1, 2, 5, 8, 6])[0],
+                                    'comment': None, 'timestamp': event['end_time'] + timedelta(hours=rng.uniform(1, 72))})
+    registration_rows.sort(key=lambda row: row['registration_date']) # Ids grow with time, like real traffic
+    _bulk_insert(Registration, registration_rows)
+    _bulk_insert(Rating, rating_rows)
+
+    # Follows (mostly of organizers, a few of them very popular) and notifications
+    organizer_weights = [1 / (rank + 1) for rank in range(len(organizer_ids))]
+    rng.shuffle(organizer_weights)
+    follow_pairs = set()
+    for user_id in user_ids:
+        for _ in range(rng.randint(0, 2 * follows_per_user)):
+            followed = rng.choices(organizer_ids, organizer_weights)[0] if rng.random() < 0.7 else rng.choice(user_ids)
+            if followed != user_id:
+                follow_pairs.add((user_id, followed))
+    _bulk_insert(followers, [{'follower_id': a, 'followed_id': b} for a, b in sorted(follow_pairs)])
+
+    notification_rows = [{
+        'user_id': user_id, 'message': f'Reminder: {rng.choice(SUBJECTS)} event coming up',
+        'is_read': rng.random() < 0.6, 'timestamp': now - timedelta(days=rng.uniform(0, 90)),
+    } for user_id in user_ids for _ in range(rng.randint(0, 2 * notifications_per_user))]
+    _bulk_insert(Notification, notification_rows)
+
+    Event.recompute_seats_taken()
+    Event.recompute_rating_aggregates()
+    User.recompute_follow_counts()
+    db.session.commit()
+
+    import feed
+    import search
+    import stats
+    feed.rebuild()
+    db.session.commit()
+    search.rebuild_search_index()
+    with db.engine.begin() as conn:
+        stats.refresh_rollups(conn)
+
+    busiest = max(seats, key=seats.get)
+    return {
+        'users': len(user_rows), 'organizers': len(organizer_ids), 'events': len(event_rows),
+        'registrations': len(registration_rows), 'ratings': len(rating_rows), 'follows': len(follow_pairs),
+        'notifications': len(notification_rows), 'admin_id': admin.id, 'busiest_event_id': busiest,
+        'event_ids': [row['id'] for row in event_rows], 'now': now,
+    }
+
+
+def create_seeded_app(db_path=None, config_overrides=None, **scale):
+    """A new app on a fresh SQLite file (temporary unless db_path is given) filled by generate()."""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(), 'campus.db')
+    app = create_app(make_config(db_path, **(config_overrides or {})))
+    with app.app_context():
+        init_db(create_all=True)
+        summary = generate(**scale)
+    return app, summary, db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='SQLite file to fill (created if missing).')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    _, summary, db_path = create_seeded_app(args.db, users=args.users, events=args.events, seed=args.seed)
+    print(f'Seeded {db_path} in {time.perf_counter() - started:.1f}s:')
+    for key in ('users', 'organizers', 'events', 'registrations', 'ratings', 'follows', 'notifications'):
+        print(f'  {key:<14} {summary[key]}')
+
+
+if __name__ == '__main__':
+    main()
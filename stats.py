@@ -0,0 +1,196 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import func, select, insert, delete
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import contains_eager
+
+from extensions import db
+from models import Event, Registration, Category, User, Rating, Job, JobStatus, StatsRollup
+from jobs import job_handler
+
+# Per-event numbers for the organizer dashboard
+EventStats = namedtuple('EventStats', ['registration_count', 'rating_count', 'average_rating'])
+OrganizerSummary = namedtuple('OrganizerSummary', ['events', 'event_stats', 'total_events', 'total_registrations', 'average_rating'])
+
+# Site-wide numbers for /statistics and the admin dashboard, read from the stats_rollup table
+SiteTotals = namedtuple('SiteTotals', ['users', 'events', 'registrations', 'categories', 'average_rating', 'refreshed_at'])
+
+TOP_EVENTS = 10 # Events kept in the 'top_events' rollup
+
+
+def organizer_summary(organizer_id):
+    """
+    Events, per-event stats and totals for one organizer in a single grouped query:
+    registrations are counted with an outer join, ratings come from the denormalized
+    rating_count/rating_sum columns, and the totals are summed in Python.
+    """
+    rows = db.session.query(Event, func.count(Registration.id)) \
+        .join(Category, Category.id == Event.category_id) \
+        .outerjoin(Registration, Registration.event_id == Event.id) \
+        .options(contains_eager(Event.category)) \
+        .filter(Event.organizer_id == organizer_id) \
+        .group_by(Event.id, Category.id) \
+        .order_by(Event.start_time.desc()) \
+        .all()
+
+    events = []
+    event_stats = {}
+    total_registrations = total_ratings = total_rating_sum = 0
+    for event, registration_count in rows:
+        events.append(event)
+        event_stats[event.id] = EventStats(registration_count, event.rating_count, event.average_rating)
+        total_registrations += registration_count
+        total_ratings += event.rating_count
+        total_rating_sum += event.rating_sum
+
+    # Average over every individual rating, not an average of per-event averages
+    average_rating = total_rating_sum / total_ratings if total_ratings else 0.0
+    return OrganizerSummary(events, event_stats, len(events), total_registrations, average_rating)
+
+
+# --- Rollups ---
+# StatsRollup rows are (metric, bucket, value). refresh_rollups() rebuilds them all in one
+# transaction; readers keep seeing the previous set until it commits. When the rollups are older
+# than STATS_MAX_AGE_SECONDS the page still uses them but queues a refresh job, so no page view
+# ever pays for the full-table counts (except the very first one, before any rollup exists).
+
+def refresh_rollups(conn):
+    """Recompute every rollup on a Core connection (inside its transaction). Returns the number of rows written."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+
+    def add(metric, bucket, value):
+        rows.append({'metric': metric, 'bucket': str(bucket), 'value': int(value or 0)})
+
+    totals = conn.execute(select(
+        select(func.count(User.id)).scalar_subquery().label('users'),
+        select(func.count(Event.id)).scalar_subquery().label('events'),
+        select(func.count(Registration.id)).scalar_subquery().label('registrations'),
+        select(func.count(Category.id)).scalar_subquery().label('categories'),
+        select(func.count(Rating.id)).scalar_subquery().label('ratings'),
+        select(func.sum(Rating.rating)).scalar_subquery().label('rating_sum'),
+    )).one()
+    for name, value in totals._mapping.items():
+        add('total', name, value)
+
+    day = func.date(Registration.registration_date)
+    since = now - timedelta(days=current_app.config.get('STATS_ROLLUP_DAYS', 365))
+    for bucket, count in conn.execute(
+            select(day, func.count(Registration.id)).where(Registration.registration_date >= since).group_by(day)):
+        add('registrations_by_day', bucket, count)
+
+    for category_id, count in conn.execute(select(Event.category_id, func.count(Event.id)).group_by(Event.category_id)):
+        add('events_by_category', category_id, count)
+    for category_id, count in conn.execute(
+            select(Event.category_id, func.count(Registration.id))
+            .join(Registration, Registration.event_id == Event.id).group_by(Event.category_id)):
+        add('registrations_by_category', category_id, count)
+
+    for event_id, seats_taken in conn.execute(
+            select(Event.id, Event.seats_taken).where(Event.seats_taken > 0)
+            .order_by(Event.seats_taken.desc(), Event.id.asc()).limit(TOP_EVENTS)):
+        add('top_events', event_id, seats_taken)
+
+    add('meta', 'refreshed_at', time.time())
+    conn.execute(delete(StatsRollup))
+    conn.execute(insert(StatsRollup), rows)
+    return len(rows)
+
+
+@job_handler('stats_rollup')
+def stats_rollup_job(job):
+    with db.engine.begin() as conn:
+        return {'rows': refresh_rollups(conn)}
+
+
+def _refresh_now():
+    # Own connection on the primary engine: the page itself may be running on the read-only one
+    with db.engine.begin() as conn:
+        refresh_rollups(conn)
+
+
+def _request_refresh():
+    """Queue a refresh job unless one is already pending (best effort: skipped if the database is busy)."""
+    if current_app.config.get('JOBS_RUN_INLINE'):
+        _refresh_now()
+        return
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    try:
+        with db.engine.begin() as conn:
+            pending = conn.execute(
+                select(Job.id).where(Job.kind == 'stats_rollup', Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])).limit(1)
+            ).first()
+            if pending is None:
+                conn.execute(insert(Job).values(
+                    kind='stats_rollup', payload={}, status=JobStatus.QUEUED, progress=0, attempts=0,
+                    max_attempts=1, run_after=now, created_at=now))
+    except OperationalError:
+        pass
+
+
+def _read(*metrics):
+    """{metric: {bucket: value}} for the given metrics, refreshing the rollups first if none exist yet."""
+    rows = db.session.query(StatsRollup.metric, StatsRollup.bucket, StatsRollup.value) \
+        .filter(StatsRollup.metric.in_(metrics + ('meta',))).all()
+    if not rows:
+        _refresh_now()
+        rows = db.session.query(StatsRollup.metric, StatsRollup.bucket, StatsRollup.value) \
+            .filter(StatsRollup.metric.in_(metrics + ('meta',))).all()
+
+    data = {metric: {} for metric in metrics + ('meta',)}
+    for metric, bucket, value in rows:
+        data[metric][bucket] = value
+    refreshed_at = data['meta'].get('refreshed_at', 0)
+    if time.time() - refreshed_at > current_app.config.get('STATS_MAX_AGE_SECONDS', 300):
+        _request_refresh()
+    return data
+
+
+def site_totals():
+    """Site-wide totals from the rollups (one small query)."""
+    data = _read('total')
+    totals = data['total']
+    ratings = totals.get('ratings', 0)
+    return SiteTotals(
+        totals.get('users', 0), totals.get('events', 0), totals.get('registrations', 0), totals.get('categories', 0),
+        totals.get('rating_sum', 0) / ratings if ratings else 0.0,
+        datetime.fromtimestamp(data['meta'].get('refreshed_at', 0), timezone.utc),
+    )
+
+
+def chart_data(days=None):
+    """
+    Series for the statistics charts: registrations per day (missing days filled with 0),
+    events and registrations per category, and the events with the most active registrations.
+    """
+    days = days or current_app.config.get('STATS_CHART_DAYS', 30)
+    data = _read('registrations_by_day', 'events_by_category', 'registrations_by_category', 'top_events')
+
+    today = datetime.now(timezone.utc).date()
+    day_labels = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+    category_names = dict(db.session.query(Category.id, Category.name).all())
+    category_ids = sorted({int(c) for c in data['events_by_category']} | {int(c) for c in data['registrations_by_category']},
+                          key=lambda c: category_names.get(c, ''))
+
+    top = sorted(data['top_events'].items(), key=lambda item: (-item[1], int(item[0])))
+    titles = dict(db.session.query(Event.id, Event.title).filter(Event.id.in_([int(e) for e, _ in top])).all()) if top else {}
+
+    return {
+        'registrations_per_day': {
+            'labels': day_labels,
+            'data': [data['registrations_by_day'].get(label, 0) for label in day_labels],
+        },
+        'categories': {
+            'labels': [category_names.get(c, 'Unknown') for c in category_ids],
+            'events': [data['events_by_category'].get(str(c), 0) for c in category_ids],
+            'registrations': [data['registrations_by_category'].get(str(c), 0) for c in category_ids],
+        },
+        'top_events': [
+            {'id': int(event_id), 'title': titles[int(event_id)], 'registrations': count}
+            for event_id, count in top if int(event_id) in titles # Skip events deleted since the refresh
+        ],
+        'refreshed_at': datetime.fromtimestamp(data['meta'].get('refreshed_at', 0), timezone.utc).isoformat(),
+    }
@@ -0,0 +1,137 @@
+"""
+Concurrency stress test for event registration capacity.
+
+Fires thousands of concurrent sign-ups (including duplicate attempts by the same user)
+at a capacity-limited event on a throwaway SQLite database, then frees seats concurrently,
+and checks that:
+  - the event is never overbooked and Event.seats_taken matches the registrations,
+  - every user ends up with at most one registration,
+  - freed seats go to the waitlist in FIFO order.
+
+Usage: python stress_registrations.py [--users 2000] [--attempts 3000] [--capacity 100] [--threads 32]
+Exits with status 1 if any check fails.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from commands import init_db
+from extensions import db
+from models import User, Event, Registration, RegistrationStatus, SEAT_HOLDING_STATUSES
+import registrations as registration_service
+from seed_data import make_config, check
+
+
+def with_retry(app, fn, *args):
+    """Run fn in its own app context/session, retrying if SQLite reports the database as locked."""
+    for attempt in range(50):
+        with app.app_context():
+            try:
+                return fn(*args)
+            except OperationalError:
+                db.session.rollback()
+        time.sleep(0.01 * (attempt + 1))
+    raise RuntimeError('Gave up after 50 locked attempts')
+
+
+def attempt_registration(event_id, user_id):
+    event = db.session.get(Event, event_id)
+    return registration_service.register_user(event, user_id) is not None
+
+
+def unregister(event_id, user_id):
+    registration = Registration.query.filter_by(user_id=user_id, event_id=event_id).first()
+    held_seat = registration.status in SEAT_HOLDING_STATUSES
+    db.session.delete(registration)
+    if held_seat:
+        registration_service.release_seat(event_id)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--attempts', type=int, default=3000)
+    parser.add_argument('--capacity', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--release', type=int, default=30, help='Seats to free concurrently afterwards')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    app = create_app(make_config(db_path, TESTING=False, SQLALCHEMY_ENGINE_OPTIONS={
+        'pool_size': args.threads,
+        'max_overflow': 0,
+        'connect_args': {'timeout': 60}, # Seconds to wait on SQLite's write lock
+    }))
+    with app.app_context():
+        init_db(create_all=True)
+
+    with app.app_context():
+        organizer = User.query.first()
+        users = [User(username=f'stress{i}', email=f'stress{i}@example.com', password_hash='x') for i in range(args.users)]
+        db.session.add_all(users)
+        event = Event(title='Popular event', description='Stress test', location='Main hall',
+                      start_time=datetime.now() + timedelta(days=7), end_time=datetime.now() + timedelta(days=7, hours=2),
+                      max_attendees=args.capacity, organizer_id=organizer.id, category_id=1)
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+        user_ids = [u.id for u in users]
+
+    # Every user tries at least once; the remaining attempts are duplicates of random users
+    attempts = user_ids + [random.choice(user_ids) for _ in range(max(0, args.attempts - len(user_ids)))]
+    random.shuffle(attempts)
+
+    print(f'Registering: {len(attempts)} attempts by {len(user_ids)} users, capacity {args.capacity}, {args.threads} threads')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        accepted = sum(pool.map(lambda uid: with_retry(app, attempt_registration, event_id, uid), attempts))
+    elapsed = time.perf_counter() - started
+    print(f'  {accepted} accepted in {elapsed:.2f}s ({len(attempts) / elapsed:.0f} attempts/s)')
+
+    failures = []
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        holding = Registration.query.filter(Registration.event_id == event_id, Registration.status.in_(SEAT_HOLDING_STATUSES)).count()
+        waitlisted = Registration.query.filter_by(event_id=event_id, status=RegistrationStatus.WAITLISTED) \
+            .order_by(Registration.registration_date.asc(), Registration.id.asc()).all()
+        duplicates = db.session.query(Registration.user_id).filter_by(event_id=event_id) \
+            .group_by(Registration.user_id).having(func.count() > 1).count()
+
+        check(f'no overbooking ({holding} seats held, capacity {args.capacity})', holding == min(args.capacity, len(user_ids)), failures)
+        check(f'seats_taken matches registrations ({event.seats_taken})', event.seats_taken == holding, failures)
+        check(f'one registration per user ({accepted} accepted)', duplicates == 0 and accepted == len(user_ids), failures)
+        check(f'everyone else waitlisted ({len(waitlisted)})', len(waitlisted) == len(user_ids) - holding, failures)
+
+        expected_promotions = [r.user_id for r in waitlisted[:args.release]]
+        releasing = [r.user_id for r in Registration.query.filter(
+            Registration.event_id == event_id, Registration.status.in_(SEAT_HOLDING_STATUSES)).limit(args.release)]
+
+    print(f'Releasing {len(releasing)} seats concurrently')
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(lambda uid: with_retry(app, unregister, event_id, uid), releasing))
+
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        holding_ids = {r.user_id for r in Registration.query.filter(
+            Registration.event_id == event_id, Registration.status.in_(SEAT_HOLDING_STATUSES))}
+        check(f'capacity still full after releases ({len(holding_ids)})', len(holding_ids) == min(args.capacity, len(user_ids)), failures)
+        check(f'seats_taken still matches ({event.seats_taken})', event.seats_taken == len(holding_ids), failures)
+        check('waitlist promoted in FIFO order', set(expected_promotions[:len(releasing)]) <= holding_ids, failures)
+
+    if failures:
+        print(f'{len(failures)} check(s) failed.')
+        sys.exit(1)
+    print('All checks passed.')
+
+
+if __name__ == '__main__':
+    main()
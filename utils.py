@@ -1,36 +1,29 @@
 import os
-import secrets
-from PIL import Image # pip install Pillow
 from flask import current_app
+from jobs import job_handler
+import images
+
+# Uploads are content-addressed and resized into WebP + fallback variants by images.py;
+# both return the static path of the full-size fallback.
 
 # Utility for saving user profile pictures
 def save_profile_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static', 'uploads', 'profile_pictures', picture_fn)
-
-    output_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-
-    # FIX: Replace backslashes with forward slashes for web URLs
-    return os.path.join('uploads', 'profile_pictures', picture_fn).replace('\\', '/')
+    return images.save_upload(form_picture, 'avatars')
 
 
 # Utility for saving event posters
 def save_event_poster(form_poster):
-    random_hex = secrets.token_hex(16)
-    _, f_ext = os.path.splitext(form_poster.filename)
-    poster_fn = random_hex + f_ext
-    poster_path = os.path.join(current_app.root_path, 'static', 'uploads', 'event_posters', poster_fn)
+    return images.save_upload(form_poster, 'posters')
+
 
-    # Resize poster
-    output_size = (800, 600)
-    i = Image.open(form_poster)
-    i.thumbnail(output_size)
-    i.save(poster_path)
+@job_handler('resize_image')
+def resize_image_job(job):
+    """Shrink an uploaded image (path relative to the app root) to fit within job.payload['size'].
+    Only kept for jobs queued before the images.py pipeline."""
+    from PIL import Image # pip install Pillow
 
-    # FIX: Replace backslashes with forward slashes for web URLs
-    return os.path.join('uploads', 'event_posters', poster_fn).replace('\\', '/')
\ No newline at end of file
+    path = os.path.join(current_app.root_path, job.payload['path'])
+    i = Image.open(path)
+    i.thumbnail(tuple(job.payload['size']))
+    i.save(path)
+    return {'path': job.payload['path'].replace('\\', '/')}